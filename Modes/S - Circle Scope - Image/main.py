@@ -27,7 +27,7 @@ def setup(screen, eyesy):
     for filepath in sorted(glob.glob(eyesy.mode_root + '/Images/*.png')):
         filename = os.path.basename(filepath)
         print('loading image file: ' + filename)
-        img = pygame.image.load(filepath).convert_alpha()
+        img = eyesy.load_image(filepath).convert_alpha()
         images.append(img)
 
 def draw(screen, eyesy):
@@ -27,7 +27,7 @@ def setup(screen, eyesy) :
     global images, image_index
     for filepath in sorted(glob.glob(eyesy.mode_root + '/Images/*.png')):
         filename = os.path.basename(filepath)
-        img = pygame.image.load(filepath)
+        img = eyesy.load_image(filepath)
         images.append(img)
         try:
             pal = len(img.get_palette())
@@ -22,7 +22,7 @@ def setup(screen, eyesy):
     for filepath in sorted(glob.glob(eyesy.mode_root + '/Images/*.png')):
         filename = os.path.basename(filepath)
         print('loading image file: ' + filename)
-        img = pygame.image.load(filepath)
+        img = eyesy.load_image(filepath)
         images.append(img)
         
         xr = eyesy.xres
@@ -37,7 +37,7 @@ def setup(screen, eyesy) :
 
     for filepath in sorted(glob.glob(eyesy.mode_root + '/Images/*.png')):
         filename = os.path.basename(filepath)
-        img = pygame.image.load(filepath)
+        img = eyesy.load_image(filepath)
         images.append(img)
         try:
             pal = len(img.get_palette())
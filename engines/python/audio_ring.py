@@ -0,0 +1,120 @@
+from multiprocessing import shared_memory
+import numpy as np
+
+BUFFER_SIZE = 100   # audio_in length, one RMS value per 8 frames
+FFT_SIZE = 1024     # frames per spectrum, about 23 ms at 44.1 kHz
+FFT_BINS = FFT_SIZE // 2
+BANDS = 32          # log spaced band energies
+RETRIES = 4         # snapshot attempts before keeping the previous frame's values
+
+# name, dtype, shape of each field in the shared block
+FIELDS = [
+    ("seq", np.uint64, (1,)),
+    ("write_index", np.int64, (1,)),
+    ("gain", np.float32, (1,)),
+    ("peak", np.float32, (2,)),
+    # each value is stored twice, at i and i + BUFFER_SIZE, so the
+    # BUFFER_SIZE values ending at write_index are always contiguous
+    ("ring", np.float32, (2, 2 * BUFFER_SIZE)),
+    ("fft", np.float32, (FFT_BINS,)),
+    ("bands", np.float32, (BANDS,)),
+    # onsets are counted, times are time.monotonic() in the audio process
+    ("onset_count", np.int64, (1,)),
+    ("onset_time", np.float64, (1,)),
+    ("beat_time", np.float64, (1,)),
+    ("bpm", np.float32, (1,)),
+    # left, right: Hz, nearest MIDI note (-1 for none), confidence 0-1
+    ("pitch", np.float32, (2,)),
+    ("note", np.int32, (2,)),
+    ("pitch_confidence", np.float32, (2,)),
+]
+# fields the renderer reads each frame, besides the levels
+READ = ["peak", "fft", "bands", "onset_count", "beat_time", "bpm", "pitch", "note", "pitch_confidence"]
+
+class AudioRing:
+    """Audio analysis shared between the audio process and the renderer.
+
+    The fields live in one shared memory block and are NumPy arrays on
+    both sides.  There is no lock: the audio process is the only writer
+    and brackets each update with a sequence counter, odd while it is
+    writing.  The renderer copies what it needs into scratch buffers and
+    keeps the copy only if the counter was even and unchanged across it, so
+    neither side ever waits on the other.  gain is the one field the
+    renderer writes.
+    """
+
+    def __init__(self, name=None):
+        offsets = []
+        size = 0
+        for field, dtype, shape in FIELDS:
+            offsets.append(size)
+            size += -(-int(np.prod(shape)) * np.dtype(dtype).itemsize // 8) * 8  # 8 byte aligned
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.shm.buf[:size] = bytes(size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.owner = name is None
+        for (field, dtype, shape), offset in zip(FIELDS, offsets):
+            setattr(self, field, np.ndarray(shape, dtype, self.shm.buf, offset))
+        # read() fills scratch and swaps it with last once the copy checks out
+        self.last = self._buffers()
+        self.scratch = self._buffers()
+
+    def _buffers(self):
+        buffers = {field: np.zeros(getattr(self, field).shape, getattr(self, field).dtype) for field in READ}
+        buffers["levels"] = np.zeros((2, BUFFER_SIZE), np.float32)
+        return buffers
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    # audio process side
+
+    def begin_write(self):
+        self.seq[0] += 1
+
+    def end_write(self):
+        self.seq[0] += 1
+
+    def push(self, rms):
+        """Append a (n, 2) array of left/right values, between begin_write and end_write."""
+        n = len(rms)
+        start = int(self.write_index[0])
+        positions = (start + np.arange(n)) % BUFFER_SIZE
+        self.ring[:, positions] = rms.T
+        self.ring[:, positions + BUFFER_SIZE] = rms.T
+        self.write_index[0] = (start + n) % BUFFER_SIZE
+
+    # renderer side
+
+    def levels(self):
+        """The last BUFFER_SIZE values per channel, oldest first, as a view into the ring."""
+        start = int(self.write_index[0])
+        return self.ring[:, start:start + BUFFER_SIZE]
+
+    def read(self):
+        """Copy the levels and READ fields into last, returns False if every attempt overlapped a write.
+
+        On False, last still holds the previous consistent copy.
+        """
+        scratch = self.scratch
+        for _ in range(RETRIES):
+            seq = int(self.seq[0])
+            if seq & 1:
+                continue
+            np.copyto(scratch["levels"], self.levels())
+            for field in READ:
+                np.copyto(scratch[field], getattr(self, field))
+            if int(self.seq[0]) == seq:
+                self.last, self.scratch = scratch, self.last
+                return True
+        return False
+
+    def close(self):
+        for field, dtype, shape in FIELDS:
+            setattr(self, field, None)
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# Headless per-mode frame benchmark.
+#
+# Loads every Modes/<name>/main.py, runs setup() and then draw() for a number
+# of frames into an offscreen surface at each entry of Eyesy.RESOLUTIONS, with
+# scripted knob sweeps, synthetic audio and a periodic trig.  Reports mean,
+# p95 and p99 draw time plus Python allocations per frame, and can save the
+# results as a JSON baseline or compare a run against an earlier one.
+#
+#   python bench.py --frames 300 --save bench_baseline.json
+#   python bench.py --resolutions 3,4 --compare bench_baseline.json
+#
+# Allocations are measured with tracemalloc in a separate, shorter pass so the
+# tracing overhead doesn't distort the timings.  Memory SDL allocates for
+# surfaces in C isn't visible to tracemalloc.
+import os
+import sys
+import time
+import math
+import json
+import argparse
+import platform
+import contextlib
+import traceback
+import tracemalloc
+import importlib.util
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame
+
+import eyesy
+
+ENGINE_PATH = os.path.dirname(os.path.abspath(__file__))
+TRIG_INTERVAL = 15      # frames between synthetic trigs
+ALLOC_FRAMES = 30       # frames traced in the allocation pass
+REGRESSION = 0.10       # slowdown vs baseline that gets reported
+
+def find_modes(modes_path):
+    modes = []
+    for name in sorted(os.listdir(modes_path)):
+        if os.path.isfile(os.path.join(modes_path, name, "main.py")):
+            modes.append(name)
+    return modes
+
+def load_mode(modes_path, name, serial):
+    # fresh module for every run so globals set up by a previous run don't leak
+    path = os.path.join(modes_path, name, "main.py")
+    spec = importlib.util.spec_from_file_location(f"bench_mode_{serial}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def palette_color(palette, t):
+    """RGB at t along an abcd cosine palette."""
+    return tuple(int(255 * max(0., min(1., a + b * math.cos(2 * math.pi * (c * t + d)))))
+                 for a, b, c, d in zip(palette["a"], palette["b"], palette["c"], palette["d"]))
+
+def add_mode_api(eyesy_obj):
+    """Stand-ins for the colour helpers modes call that Eyesy doesn't provide."""
+    def color_picker(t):
+        return palette_color(eyesy_obj.palettes[eyesy_obj.fg_palette], t)
+    def color_picker_bg(t):
+        eyesy_obj.bg_color = palette_color(eyesy_obj.palettes[eyesy_obj.bg_palette], t)
+        return eyesy_obj.bg_color
+    def color_picker_lfo(t, max_rate=.5):
+        # knob sets the rate the colour cycles through the palette
+        eyesy_obj.color_lfo_index += t * max_rate * .1
+        return color_picker(eyesy_obj.color_lfo_index)
+    for name, f in (("color_picker", color_picker), ("color_picker_bg", color_picker_bg),
+                    ("color_picker_lfo", color_picker_lfo)):
+        if not hasattr(eyesy_obj, name):
+            setattr(eyesy_obj, name, f)
+
+def drive_inputs(eyesy_obj, frame, frames):
+    """Scripted knob sweeps, synthetic audio and periodic trig for one frame."""
+    t = frame / max(frames - 1, 1)
+    for i in range(5):
+        # each knob sweeps up and down at its own rate
+        eyesy_obj.knob[i] = 0.5 - 0.5 * math.cos(2 * math.pi * t * (i + 1))
+    eyesy_obj.knob1, eyesy_obj.knob2, eyesy_obj.knob3, eyesy_obj.knob4, eyesy_obj.knob5 = eyesy_obj.knob
+
+    level = 16000 * (0.5 + 0.5 * math.sin(2 * math.pi * t * 3))
+    n = len(eyesy_obj.audio_in)
+    for i in range(n):
+        phase = 2 * math.pi * (i / n * 4 + frame * 0.1)
+        eyesy_obj.audio_in[i] = level * math.sin(phase)
+        eyesy_obj.audio_in_r[i] = level * math.cos(phase)
+    eyesy_obj.audio_peak = level
+    eyesy_obj.audio_peak_r = level
+
+    eyesy_obj.trig = (frame % TRIG_INTERVAL) == 0
+    eyesy_obj.frame_count = frame
+
+def run_frames(eyesy_obj, mode, screen, frames, on_frame=None):
+    for frame in range(frames):
+        drive_inputs(eyesy_obj, frame, frames)
+        if eyesy_obj.auto_clear:
+            screen.fill(eyesy_obj.bg_color)
+        if on_frame: on_frame(frame, True)
+        mode.draw(screen, eyesy_obj)
+        if on_frame: on_frame(frame, False)
+
+def bench_mode(eyesy_obj, modes_path, name, res, frames, serial):
+    """Benchmark one mode at one resolution, returns a result dict."""
+    result = {"mode": name, "res": list(res)}
+    hwscreen = pygame.display.set_mode(res)
+    screen = pygame.Surface(res)
+    eyesy_obj.xres, eyesy_obj.yres = res
+    eyesy_obj.screen = screen
+    eyesy_obj.mode = name
+    eyesy_obj.mode_root = os.path.join(modes_path, name)
+    eyesy_obj.auto_clear = True
+    eyesy_obj.bg_color = (0, 0, 0)
+
+    try:
+        # timing pass
+        mode = load_mode(modes_path, name, serial)
+        start = time.perf_counter()
+        mode.setup(hwscreen, eyesy_obj)
+        result["setup_ms"] = (time.perf_counter() - start) * 1000
+
+        times = np.zeros(frames)
+        marks = [0.0]
+        def time_frame(frame, before):
+            if before: marks[0] = time.perf_counter()
+            else: times[frame] = time.perf_counter() - marks[0]
+        run_frames(eyesy_obj, mode, screen, frames, time_frame)
+
+        # allocation pass, on a fresh copy of the mode
+        mode = load_mode(modes_path, name, f"{serial}_alloc")
+        mode.setup(hwscreen, eyesy_obj)
+        alloc_frames = min(frames, ALLOC_FRAMES)
+        peaks = np.zeros(alloc_frames)
+        tracemalloc.start()
+        base = [0]
+        def trace_frame(frame, before):
+            if before:
+                tracemalloc.reset_peak()
+                base[0] = tracemalloc.get_traced_memory()[0]
+            else:
+                peaks[frame] = tracemalloc.get_traced_memory()[1] - base[0]
+        first = tracemalloc.get_traced_memory()[0]
+        run_frames(eyesy_obj, mode, screen, alloc_frames, trace_frame)
+        retained = tracemalloc.get_traced_memory()[0] - first
+        tracemalloc.stop()
+    except Exception:
+        if tracemalloc.is_tracing(): tracemalloc.stop()
+        result["error"] = traceback.format_exc().strip().splitlines()[-1]
+        return result
+
+    ms = times * 1000
+    result["mean_ms"] = float(np.mean(ms))
+    result["p95_ms"] = float(np.percentile(ms, 95))
+    result["p99_ms"] = float(np.percentile(ms, 99))
+    result["max_ms"] = float(np.max(ms))
+    result["alloc_kb_per_frame"] = float(np.mean(peaks) / 1024)
+    result["retained_kb_per_frame"] = float(retained / alloc_frames / 1024)
+    return result
+
+def compare(results, baseline):
+    """Return lines describing modes that got slower (or faster) than baseline."""
+    old = {(r["mode"], tuple(r["res"])): r for r in baseline["results"]}
+    lines = []
+    for r in results:
+        b = old.get((r["mode"], tuple(r["res"])))
+        if b is None or "error" in r or "error" in b:
+            continue
+        for key in ("mean_ms", "p95_ms"):
+            if b[key] <= 0: continue
+            change = (r[key] - b[key]) / b[key]
+            if abs(change) > REGRESSION:
+                what = "slower" if change > 0 else "faster"
+                lines.append(f"{r['mode']} @ {r['res'][0]}x{r['res'][1]}: {key} {b[key]:.2f} -> {r[key]:.2f} ({change:+.0%} {what})")
+    return lines
+
+def print_report(results, target_fps):
+    budget = 1000 / target_fps
+    print(f"{'mode':40} {'res':>10} {'mean':>7} {'p95':>7} {'p99':>7} {'KB/f':>7}")
+    for r in results:
+        res = f"{r['res'][0]}x{r['res'][1]}"
+        if "error" in r:
+            print(f"{r['mode'][:40]:40} {res:>10}  ERROR {r['error']}")
+            continue
+        flag = "  < %d fps" % target_fps if r["p95_ms"] > budget else ""
+        print(f"{r['mode'][:40]:40} {res:>10} {r['mean_ms']:7.2f} {r['p95_ms']:7.2f} {r['p99_ms']:7.2f} {r['alloc_kb_per_frame']:7.1f}{flag}")
+
+def main():
+    eyesy_obj = eyesy.Eyesy()
+    default_modes = os.path.normpath(os.path.join(ENGINE_PATH, eyesy_obj.MODES_PATH))
+
+    parser = argparse.ArgumentParser(description="Headless per-mode frame benchmark")
+    parser.add_argument("--frames", type=int, default=300, help="frames drawn per mode and resolution")
+    parser.add_argument("--modes-path", default=default_modes)
+    parser.add_argument("--modes", help="comma separated mode names (default: all)")
+    parser.add_argument("--resolutions", help="comma separated indexes into Eyesy.RESOLUTIONS (default: all)")
+    parser.add_argument("--target-fps", type=float, default=30)
+    parser.add_argument("--save", help="write results to this JSON baseline file")
+    parser.add_argument("--compare", help="compare against this JSON baseline file")
+    args = parser.parse_args()
+
+    # modes and fonts are loaded relative to the engine dir, same as the service
+    modes_path = os.path.abspath(args.modes_path)
+    os.chdir(ENGINE_PATH)
+
+    modes = args.modes.split(",") if args.modes else find_modes(modes_path)
+    if args.resolutions:
+        resolutions = [eyesy_obj.RESOLUTIONS[int(i)] for i in args.resolutions.split(",")]
+    else:
+        resolutions = eyesy_obj.RESOLUTIONS
+
+    pygame.init()
+    eyesy_obj.font = pygame.font.Font("font.ttf", 16)
+    add_mode_api(eyesy_obj)
+
+    results = []
+    serial = 0
+    # modes print while loading and drawing, keep that out of the report
+    with contextlib.redirect_stdout(sys.stderr):
+        for res in resolutions:
+            for name in modes:
+                serial += 1
+                print(f"{res['name']}: {name}")
+                results.append(bench_mode(eyesy_obj, modes_path, name, res["res"], args.frames, serial))
+
+    pygame.quit()
+    print_report(results, args.target_fps)
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        changes = compare(results, baseline)
+        print(f"\nCompared to {args.compare}:")
+        for line in changes or ["no changes over %d%%" % (REGRESSION * 100)]:
+            print("  " + line)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "platform": platform.platform(),
+                "python": platform.python_version(),
+                "pygame": pygame.version.ver,
+                "frames": args.frames,
+                "results": results
+            }, f, indent=4)
+        print(f"Saved baseline: {args.save}")
+
+if __name__ == "__main__":
+    main()
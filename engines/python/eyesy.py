@@ -5,15 +5,18 @@ import pygame
 import traceback
 import imp
 import os
-import glob
 import sys
 import time
 import json
+import numpy as np
 import helpers
 import file_operations
 import csv
 import color_palettes
 import config
+import mode_registry
+import grabs
+import audio_ring
 
 class Eyesy:
 
@@ -38,7 +41,13 @@ class Eyesy:
         self.RES = (0,0)
         self.TRIGGER_SOURCES = ["Audio", "MIDI Note", "Audio or MIDI Note", 
                               "MIDI Clock 16th Note", "MIDI Clock 8th Note", 
-                              "MIDI Clock 1/4 Note", "MIDI Clock Whole Note"]
+                              "MIDI Clock 1/4 Note", "MIDI Clock Whole Note", "Audio Onset"]
+        # 0 locks to the composite video field rate
+        self.FRAME_RATES = [30, 50, 60, 0]
+        self.OVERBUDGET_POLICIES = ["Skip OSD", "Hold Frame", "Lower Resolution"]
+        self.BLEND_MODES = ["Mix", "Add", "Multiply", "Screen", "Difference"]
+        self.TRANSITIONS = ["Cut", "Dissolve", "Wipe", "Zoom"]
+        self.RECORD_FORMATS = ["Y4M", "PNG"]
 
         self.DEFAULT_CONFIG = {
             "video_resolution": 3,
@@ -52,11 +61,23 @@ class Eyesy:
             "knob3_cc": 22,
             "knob4_cc": 23,
             "knob5_cc": 24,
+            "knob_14bit": False,
             "auto_clear_cc": 25,
             "fg_palette_cc": -1,
             "bg_palette_cc": -1,
             "mode_cc": -1,
+            "mixer_xfade_cc": -1,
+            "mixer_blend_cc": -1,
+            "layer_b_cc": -1,
             "notes_change_mode": False,
+            "frame_rate": 30,
+            "overbudget_policy": 0,
+            "mode_cache_mb": 128,
+            "isolate_modes": False,
+            "mixer": False,
+            "transition": 1,
+            "transition_time": 1.0,
+            "record_format": 0,
             "pc_map": {}
         }
 
@@ -78,6 +99,9 @@ class Eyesy:
         self.grabcount = 0
         self.grabindex = 0
         self.screengrab_flag = False
+        self.grabber = None
+        self.recorder = None
+        self.record_flag = False
 
         # Modes
         self.mode_names = []
@@ -86,6 +110,19 @@ class Eyesy:
         self.mode_root = ''
         self.error = ''
         self.run_setup = False
+        self.mode_registry = None
+        self.mode_prefetcher = None
+        self.mode_reloader = None
+        self.mode_worker = None
+        self.mode_transition = None
+        # Images/*.png decoded ahead of time by the prefetcher, by absolute path
+        self.preloaded_images = {}
+
+        # Mixer, layer A is the current mode
+        self.mixer = None
+        self.mixer_xfade = 0.
+        self.mixer_blend = 0
+        self.layer_b_index = 0
 
         # Scenes
         self.scenes = []
@@ -95,8 +132,22 @@ class Eyesy:
         self.next_numbered_scene = 1
 
         # Audio
-        self.audio_in = [0] * 100
-        self.audio_in_r = [0] * 100
+        # oldest first, filled in place from the shared audio ring.  float64,
+        # so elements are Python floats that pygame takes as coordinates
+        self.audio_in = np.zeros(100)
+        self.audio_in_r = np.zeros(100)
+        # magnitude spectrum up to half the sample rate, and log spaced bands from 40 Hz to 16 kHz
+        self.audio_fft = np.zeros(audio_ring.FFT_BINS)
+        self.audio_bands = np.zeros(audio_ring.BANDS)
+        # onsets detected in the audio process, tempo and where we are in the beat (0-1)
+        self.audio_onset = False
+        self.onset_count = 0
+        self.audio_bpm = 0.
+        self.beat_phase = 0.
+        # left, right: fundamental in Hz (0 for none), nearest MIDI note (-1 for none), confidence 0-1
+        self.audio_pitch = np.zeros(2)
+        self.audio_note = np.full(2, -1, np.int32)
+        self.audio_pitch_confidence = np.zeros(2)
         self.audio_peak = 0
         self.audio_peak_r = 0
         self.audio_scale = 1.0
@@ -115,13 +166,29 @@ class Eyesy:
         self.knob_last = [-1] * 5
 
         # MIDI
-        self.midi_notes = [0] * 128
-        self.midi_notes_last = [0] * 128
+        # 1/0 per note as before, with velocity, time.monotonic() of the last
+        # on and off, and which notes changed this frame
+        self.midi_notes = np.zeros(128, np.uint8)
+        self.midi_notes_last = np.zeros(128, np.uint8)
+        self.midi_velocity = np.zeros(128, np.uint8)
+        self.midi_note_on_time = np.zeros(128)
+        self.midi_note_off_time = np.zeros(128)
+        self.midi_notes_changed = np.zeros(128, bool)
+        self.midi_note_changes = 0
         self.midi_note_new = False
         self.midi_clk = 0
+        # from incoming MIDI clock, phases run 0-1 over a beat and a 4/4 bar
+        self.midi_bpm = 0.
+        self.midi_beat_phase = 0.
+        self.midi_bar_phase = 0.
+        self.midi_clock_running = False
         self.new_midi = False
         self.usb_midi_name = ''
         self.usb_midi_present = False
+        # events/s per port over the last second, events waiting at the last drain and the most ever
+        self.midi_rates = {}
+        self.midi_queue_depth = 0
+        self.midi_max_queue_depth = 0
 
         # System
         self.led = 0
@@ -139,7 +206,12 @@ class Eyesy:
         self.osd_first = False
         self.trig = False
         self.fps = 0
+        self.target_fps = 30
         self.frame_count = 0
+        self.frame_timer = None
+        self.frame_pacer = None
+        self.render_scaler = None
+        self.trace_dump_flag = False
         self.font = None
         self.running_from_usb = False
         self.usb_midi_device = None
@@ -290,6 +362,12 @@ class Eyesy:
 
     def validate_config(self):
         """Validate and sanitize configuration values."""
+        # older configs keep these under "advanced", they live at the top level now
+        advanced = self.config.get("advanced", {})
+        for old, new in (("fps_limit", "frame_rate"), ("transition_time", "transition_time")):
+            if old in advanced:
+                self.config.setdefault(new, advanced.pop(old))
+
         # Ensure all required keys exist
         for key in self.DEFAULT_CONFIG:
             if key not in self.config:
@@ -300,6 +378,21 @@ class Eyesy:
             if not (0 <= self.config["video_resolution"] < len(self.RESOLUTIONS)):
                 self.config["video_resolution"] = self.DEFAULT_CONFIG["video_resolution"]
         
+        if self.config["frame_rate"] not in self.FRAME_RATES:
+            self.config["frame_rate"] = self.DEFAULT_CONFIG["frame_rate"]
+
+        if not (0 <= self.config["overbudget_policy"] < len(self.OVERBUDGET_POLICIES)):
+            self.config["overbudget_policy"] = self.DEFAULT_CONFIG["overbudget_policy"]
+
+        if not (0 <= self.config["transition"] < len(self.TRANSITIONS)):
+            self.config["transition"] = self.DEFAULT_CONFIG["transition"]
+
+        if not isinstance(self.config["transition_time"], (int, float)) or self.config["transition_time"] < 0:
+            self.config["transition_time"] = self.DEFAULT_CONFIG["transition_time"]
+
+        if not (0 <= self.config["record_format"] < len(self.RECORD_FORMATS)):
+            self.config["record_format"] = self.DEFAULT_CONFIG["record_format"]
+
         # Validate palette indices
         if "fg_palette" in self.config:
             if not isinstance(self.config["fg_palette"], int) or self.config["fg_palette"] < 0:
@@ -310,15 +403,16 @@ class Eyesy:
                 self.config["bg_palette"] = self.DEFAULT_CONFIG["bg_palette"]
 
     def clear_flags(self):
-        """Reset all state flags."""
+        """Reset the per-frame input flags, once this frame has seen them.
+
+        Requests set from other threads, screengrab_flag and new_led, are
+        left to the code that acts on them.
+        """
         self.new_midi = False
         self.trig = False
-        self.run_setup = False
-        self.screengrab_flag = False
         self.midi_note_new = False
-        
-        for i in range(128):
-            self.midi_notes_last[i] = self.midi_notes[i]
+        np.copyto(self.midi_notes_last, self.midi_notes)
+        self.midi_notes_changed[:] = False
             
         self.key1_press = False
         self.key2_press = False
@@ -330,14 +424,13 @@ class Eyesy:
         self.key8_press = False
         self.key9_press = False
         self.key10_press = False
-        self.new_led = False
 
     def load_modes(self):
         """Load available modes from the modes directory."""
         try:
-            mode_files = glob.glob(os.path.join(self.MODES_PATH, "*.py"))
-            self.mode_names = [os.path.splitext(os.path.basename(f))[0] for f in mode_files]
-            
+            self.mode_registry = mode_registry.ModeRegistry(self.MODES_PATH, self.config.get("mode_cache_mb", 128))
+            self.mode_names = self.mode_registry.discover()
+
             if not self.mode_names:
                 return False
                 
@@ -348,6 +441,35 @@ class Eyesy:
             print(f"Error loading modes: {e}")
             return False
 
+    def toggle_recording(self):
+        """Start or stop recording the output to GRABS_PATH."""
+        self.record_flag = False
+        try:
+            self.recorder.toggle(self.RES, self.target_fps, self.RECORD_FORMATS[self.config["record_format"]])
+        except Exception as e:
+            print(f"Error toggling recording: {e}")
+
+    def dump_frame_trace(self):
+        """Save the recent frame timings as a Chrome trace JSON file."""
+        try:
+            timestamp = time.strftime("%Y%m%d-%H%M%S")
+            filename = os.path.join(self.GRABS_PATH, f"trace_{timestamp}.json")
+            self.frame_timer.dump(filename)
+            print(f"Saved frame trace: {filename}")
+            self.trace_dump_flag = False
+            return True
+        except Exception as e:
+            print(f"Error saving frame trace: {e}")
+            self.trace_dump_flag = False
+            return False
+
+    def load_image(self, path):
+        """pygame.image.load for modes, served from preloaded_images when the prefetcher has it."""
+        img = self.preloaded_images.pop(os.path.abspath(path), None)
+        if img is None:
+            img = pygame.image.load(path)
+        return img
+
     def set_mode_by_index(self, index):
         """Set the current mode by index."""
         if 0 <= index < len(self.mode_names):
@@ -358,6 +480,21 @@ class Eyesy:
             return True
         return False
 
+    def set_mode_by_name(self, name):
+        """Set the current mode by folder name, picking up newly added modes."""
+        if name not in self.mode_names and self.mode_registry:
+            self.mode_names = self.mode_registry.discover()
+        if name in self.mode_names:
+            return self.set_mode_by_index(self.mode_names.index(name))
+        return False
+
+    def reload_mode(self):
+        """Re-import the current mode's code, it is swapped in at the next frame."""
+        if self.mode_reloader:
+            self.mode_reloader.request(self.mode)
+        else:
+            self.run_setup = True
+
     def save_config(self):
         """Save current configuration to file."""
         try:
@@ -381,22 +518,16 @@ class Eyesy:
         for i in range(5):
             if not self.knob_override[i]:
                 self.knob[i] = self.knob_hardware[i]
-        
-        # Check for new MIDI notes
-        self.midi_note_new = any(
-            self.midi_notes[i] != self.midi_notes_last[i]
-            for i in range(128)
-        )
+        # midi_note_new is set by the MIDI handler as notes arrive
 
     def screengrab(self):
-        """Save a screenshot of the current display."""
+        """Queue a screenshot of the current mode output, it is saved on a background thread."""
+        self.screengrab_flag = False
         try:
-            timestamp = time.strftime("%Y%m%d-%H%M%S")
-            filename = os.path.join(self.GRABS_PATH, f"grab_{timestamp}.png")
-            pygame.image.save(self.screen, filename)
-            print(f"Saved screengrab: {filename}")
-            self.screengrab_flag = False
+            if self.grabber is None:
+                self.grabber = grabs.ScreenGrabber(self)
+            self.grabber.grab(self.screen)
             return True
         except Exception as e:
             print(f"Error saving screengrab: {e}")
-            return False
\ No newline at end of file
+            return False
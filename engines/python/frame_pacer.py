@@ -0,0 +1,64 @@
+import time
+
+# what to do on the frame after one that went over budget
+POLICY_SKIP_OSD = 0
+POLICY_HOLD_FRAME = 1
+POLICY_LOWER_RES = 2  # handled by render_scale.RenderScaler
+
+FIELD_RATES = {
+    "NTSC": 59.94, "NTSC-J": 59.94, "NTSC-443": 59.94, "PAL-M": 59.94, "PAL60": 59.94,
+    "PAL": 50., "PAL-N": 50., "SECAM": 50.
+}
+
+SPIN = .0005  # finish the wait busy-looping, time.sleep overshoots by this much
+
+def composite_field_rate(tv_norm):
+    return FIELD_RATES.get(tv_norm, 59.94)
+
+class FramePacer:
+    """Deadline based frame scheduler.
+
+    Frames are released on a fixed grid of deadlines one period apart, so the
+    time spent drawing doesn't add to the interval the way Clock.tick() does.
+    A frame that runs past its deadline drops to the next grid slot and sets
+    a flag telling the main loop to shed work on the following frame.
+    """
+
+    def __init__(self, fps, policy=POLICY_SKIP_OSD):
+        self.policy = policy
+        self.set_rate(fps)
+        self.frame_start = time.perf_counter()
+        self.deadline = self.frame_start + self.period
+        self.cost = 0
+        self.late_frames = 0
+        self.skip_osd = False
+        self.hold_frame = False
+
+    def set_rate(self, fps):
+        self.fps = fps
+        self.period = 1. / fps
+
+    def begin(self):
+        self.frame_start = time.perf_counter()
+
+    def wait(self):
+        """Sleep off whatever is left of this frame's budget."""
+        now = time.perf_counter()
+        self.cost = now - self.frame_start
+        over = self.cost > self.period
+        self.skip_osd = over and self.policy == POLICY_SKIP_OSD
+        # don't hold two frames in a row, that would halve the rate for good
+        self.hold_frame = over and self.policy == POLICY_HOLD_FRAME and not self.hold_frame
+
+        if now > self.deadline:
+            # missed it, pick up the grid from here instead of trying to catch up
+            self.late_frames += 1
+            self.deadline = now + self.period
+            return
+
+        remaining = self.deadline - now
+        if remaining > SPIN:
+            time.sleep(remaining - SPIN)
+        while time.perf_counter() < self.deadline:
+            pass
+        self.deadline += self.period
@@ -0,0 +1,107 @@
+import json
+import time
+import numpy as np
+
+# phases timed in run_main_loop, in the order they happen
+PHASES = ["state", "audio", "setup", "draw", "blit", "osd", "menu", "flip"]
+PHASE_COLORS = [
+    (120, 120, 120),  # state
+    (0, 200, 255),    # audio
+    (255, 0, 255),    # setup
+    (0, 220, 0),      # draw
+    (255, 160, 0),    # blit
+    (0, 0, 255),      # osd
+    (255, 255, 255),  # menu
+    (255, 0, 0),      # flip
+]
+HISTORY = 170  # frames kept, one graph column each
+
+class _Phase:
+    def __init__(self, timer, index):
+        self.timer = timer
+        self.index = index
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        t = self.timer
+        t.starts[t.index, self.index] = self.start
+        t.times[t.index, self.index] += time.perf_counter() - self.start
+        return False
+
+class FrameTimer:
+    """Ring buffer of per-phase frame timings."""
+
+    def __init__(self, size=HISTORY):
+        self.size = size
+        self.times = np.zeros((size, len(PHASES)))   # seconds spent per phase
+        self.starts = np.zeros((size, len(PHASES)))  # perf_counter at phase start
+        self.frame_starts = np.zeros(size)
+        self.frame_totals = np.zeros(size)
+        self.index = 0
+        self.frames = 0
+        self._phases = {name: _Phase(self, i) for i, name in enumerate(PHASES)}
+
+    def begin_frame(self):
+        if self.frames:
+            self.frame_totals[self.index] = time.perf_counter() - self.frame_starts[self.index]
+        self.index = (self.index + 1) % self.size
+        self.times[self.index] = 0
+        self.starts[self.index] = 0
+        self.frame_totals[self.index] = 0
+        self.frame_starts[self.index] = time.perf_counter()
+        self.frames += 1
+
+    def phase(self, name):
+        """Context manager timing one phase of the current frame."""
+        return self._phases[name]
+
+    def ordered(self, array):
+        """Rows of array oldest first, ending with the current frame."""
+        return np.roll(array, -(self.index + 1), axis=0)
+
+    def last_frame_ms(self):
+        return self.frame_totals[self.index - 1] * 1000
+
+    def worst_frame_ms(self):
+        return self.frame_totals.max() * 1000
+
+    def chrome_trace(self):
+        """Timings as a Chrome trace (chrome://tracing, Perfetto)."""
+        events = []
+        count = min(self.frames, self.size)
+        frame_starts = self.ordered(self.frame_starts)[-count:]
+        frame_totals = self.ordered(self.frame_totals)[-count:]
+        starts = self.ordered(self.starts)[-count:]
+        times = self.ordered(self.times)[-count:]
+        t0 = frame_starts[0]
+        for f in range(count):
+            if frame_totals[f] > 0:
+                events.append({"name": "frame", "ph": "X", "pid": 1, "tid": 1,
+                               "ts": (frame_starts[f] - t0) * 1e6, "dur": frame_totals[f] * 1e6})
+            for p, name in enumerate(PHASES):
+                if times[f, p] > 0:
+                    events.append({"name": name, "ph": "X", "pid": 1, "tid": 2,
+                                   "ts": (starts[f, p] - t0) * 1e6, "dur": times[f, p] * 1e6})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def graph_pixels(self, height, budget):
+        """Stacked frame-time graph as an RGB array of (size, height, 3) for surfarray.
+
+        The frame budget (seconds) sits at half the graph height.
+        """
+        scale = (height / 2) / budget
+        tops = np.cumsum(self.ordered(self.times), axis=1) * scale
+        bottoms = tops - self.ordered(self.times) * scale
+        y = np.arange(height)[::-1][None, :]  # bottom row is 0
+        pixels = np.zeros((self.size, height, 3), dtype=np.uint8)
+        for p, color in enumerate(PHASE_COLORS):
+            mask = (y >= bottoms[:, p, None]) & (y < tops[:, p, None])
+            pixels[mask] = color
+        pixels[:, height // 2] = (80, 80, 80)
+        return pixels
@@ -0,0 +1,202 @@
+import os
+import time
+import json
+import zlib
+import queue
+import struct
+import threading
+import numpy as np
+import pygame
+
+THUMB_HEIGHT = 72   # fits the OSD's recent grabs column, 78 px apart
+THUMB_MAX_WIDTH = 128
+RECENT = 10         # thumbnails kept in eyesy.tengrabs_thumbs
+INDEX_FILE = ".grabs_index.json"
+THUMBS_DIR = ".thumbs"
+
+def write_png(surface, filename):
+    """Save surface as an RGB PNG.
+
+    pygame.image.save keeps the GIL for the whole encode, which stalls the
+    render loop; zlib releases it while compressing.
+    """
+    w, h = surface.get_size()
+    rows = np.frombuffer(pygame.image.tobytes(surface, "RGB"), np.uint8).reshape(h, w * 3)
+    # filter type 0 (none) in front of each scanline
+    raw = np.hstack((np.zeros((h, 1), np.uint8), rows)).tobytes()
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    with open(filename, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw, 6)))
+        f.write(chunk(b"IEND", b""))
+
+def thumb_size(size):
+    w, h = size
+    tw = min(THUMB_MAX_WIDTH, max(1, round(w * THUMB_HEIGHT / h)))
+    return tw, max(1, round(h * tw / w))
+
+def make_thumb(surface):
+    # a cheap nearest scale first keeps the smooth pass small
+    tw, th = thumb_size(surface.get_size())
+    return pygame.transform.smoothscale(pygame.transform.scale(surface, (tw * 4, th * 4)), (tw, th))
+
+class GrabIndex:
+    """Index of the PNGs in GRABS_PATH with a cache of their thumbnails.
+
+    Each entry holds the file's size, mtime and resolution, and for grabs
+    taken here the mode and scene on screen at the time.  Thumbnails live
+    in GRABS_PATH/.thumbs, so listing or previewing grabs reads the small
+    index and thumbnails instead of decoding full frames.
+    """
+
+    def __init__(self, grabs_path):
+        self.grabs_path = grabs_path
+        self.path = os.path.join(grabs_path, INDEX_FILE)
+        self.thumbs_path = os.path.join(grabs_path, THUMBS_DIR)
+        self.entries = {}
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)["grabs"]
+        except (OSError, ValueError, KeyError):
+            self.entries = {}
+
+    def save(self):
+        # written aside and renamed, a power cut never leaves half an index
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"grabs": self.entries}, f)
+        os.replace(tmp, self.path)
+
+    def thumb_path(self, name):
+        return os.path.join(self.thumbs_path, name)
+
+    def add(self, filename, surface, thumb, mode=None, scene=None):
+        """Record a grab that was just written, with its thumbnail."""
+        name = os.path.basename(filename)
+        os.makedirs(self.thumbs_path, exist_ok=True)
+        write_png(thumb, self.thumb_path(name))
+        st = os.stat(filename)
+        self.entries[name] = {"size": st.st_size, "mtime": st.st_mtime,
+                              "res": list(surface.get_size()), "mode": mode, "scene": scene}
+
+    def refresh(self):
+        """Bring the index in line with the folder, returns True if anything changed.
+
+        Only files that are new or changed since they were indexed, such as
+        ones copied over USB, are decoded.
+        """
+        changed = False
+        names = set()
+        for name in os.listdir(self.grabs_path):
+            if not name.lower().endswith(".png"):
+                continue
+            names.add(name)
+            filename = os.path.join(self.grabs_path, name)
+            try:
+                st = os.stat(filename)
+                entry = self.entries.get(name)
+                if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime \
+                        and os.path.exists(self.thumb_path(name)):
+                    continue
+                surface = pygame.image.load(filename)
+                if surface.get_bitsize() < 24:
+                    # smoothscale needs 24 or 32 bit
+                    rgb = pygame.Surface(surface.get_size(), 0, 24)
+                    rgb.blit(surface, (0, 0))
+                    surface = rgb
+                self.add(filename, surface, make_thumb(surface),
+                         entry and entry["mode"], entry and entry["scene"])
+                changed = True
+            except Exception as e:
+                print(f"Couldn't index grab {name}: {e}")
+        for name in set(self.entries) - names:
+            del self.entries[name]
+            try:
+                os.remove(self.thumb_path(name))
+            except OSError:
+                pass
+            changed = True
+        return changed
+
+    def recent(self, count=RECENT):
+        """Names of the newest grabs, newest first."""
+        return sorted(self.entries, key=lambda n: self.entries[n]["mtime"], reverse=True)[:count]
+
+    def load_thumb(self, name):
+        return pygame.image.load(self.thumb_path(name))
+
+class ScreenGrabber:
+    """Saves screengrabs and their thumbnails on a background thread.
+
+    grab() only copies the surface; PNG encoding and scaling down to a
+    thumbnail happen on the thread, so a grab costs the render loop one
+    surface copy.  Grabs taken in quick succession queue up in order.
+
+    On start the thread brings the grab index up to date and fills the
+    recent thumbnails from its cache.
+    """
+
+    def __init__(self, eyesy):
+        self.eyesy = eyesy
+        self.index = GrabIndex(eyesy.GRABS_PATH)
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def grab(self, surface):
+        # timestamp and what's on screen now, the file may be written a few frames later
+        eyesy = self.eyesy
+        scene = eyesy.scenes[eyesy.scene_index]["name"] if 0 <= eyesy.scene_index < len(eyesy.scenes) else None
+        self.queue.put((surface.copy(), time.time(), eyesy.mode, scene))
+
+    def _run(self):
+        try:
+            self._load_index()
+        except Exception as e:
+            print(f"Error loading grab index: {e}")
+        while True:
+            surface, when, mode, scene = self.queue.get()
+            try:
+                self._save(surface, when, mode, scene)
+            except Exception as e:
+                print(f"Error saving screengrab: {e}")
+
+    def _load_index(self):
+        index = self.index
+        index.load()
+        if index.refresh():
+            index.save()
+        eyesy = self.eyesy
+        eyesy.grabcount = len(index.entries)
+        recent = index.recent()
+        eyesy.tengrabs_thumbs = [index.load_thumb(name) for name in recent]
+        if recent:
+            eyesy.lastgrab = os.path.join(index.grabs_path, recent[0])
+            eyesy.lastgrab_thumb = eyesy.tengrabs_thumbs[0]
+
+    def _save(self, surface, when, mode, scene):
+        eyesy = self.eyesy
+        timestamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(when))
+        filename = os.path.join(eyesy.GRABS_PATH, f"grab_{timestamp}.png")
+        # grabs in the same second get a suffix rather than overwriting
+        n = 1
+        while os.path.exists(filename):
+            filename = os.path.join(eyesy.GRABS_PATH, f"grab_{timestamp}_{n}.png")
+            n += 1
+        write_png(surface, filename)
+        thumb = make_thumb(surface)
+        self.index.add(filename, surface, thumb, mode, scene)
+        self.index.save()
+
+        eyesy.lastgrab = filename
+        eyesy.lastgrab_thumb = thumb
+        # a new list, the OSD may be iterating the old one
+        eyesy.tengrabs_thumbs = [thumb] + eyesy.tengrabs_thumbs[:RECENT - 1]
+        eyesy.grabcount += 1
+        print(f"Saved screengrab: {filename}")
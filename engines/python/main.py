@@ -6,8 +6,9 @@ import signal
 import traceback
 import logging
 import gc
-from multiprocessing import Process, Array, Value, Lock
-from ctypes import c_float
+import atexit
+from multiprocessing import Process
+import numpy as np
 import math
 import psutil
 
@@ -19,11 +20,22 @@ from pythonosc import osc_server, dispatcher, udp_client
 from pythonosc.osc_message_builder import OscMessageBuilder
 
 import sound
+import audio_ring
 import osd
+import frame_timing
+import frame_pacer
+import render_scale
+import mode_prefetch
+import mode_watch
+import mode_worker
+import mixer
+import transitions
+import recorder
+import grabs
 import usbdrive
 from screen_main_menu import ScreenMainMenu
 from screen_test import ScreenTest
-from screen_video_settings import ScreenVideoSettings
+from screen_video_settings import ScreenVideoSettings, get_tv_norm
 from screen_palette import ScreenPalette
 from screen_wifi import ScreenWiFi
 from screen_applogs import ScreenApplogs
@@ -44,6 +56,7 @@ class OSCManager:
         self.eyesy = eyesy
         self.dispatcher = dispatcher.Dispatcher()
         self.server = None
+        self.editor_server = None
         self.client = None
         self.running = False
 
@@ -52,6 +65,14 @@ class OSCManager:
             self.dispatcher.map("/knob/*", self.handle_knob)
             self.dispatcher.map("/led", self.handle_led)
             self.dispatcher.map("/mode", self.handle_mode)
+            self.dispatcher.map("/trace", self.handle_trace)
+            self.dispatcher.map("/set", self.handle_set)
+            self.dispatcher.map("/reload", self.handle_reload)
+            self.dispatcher.map("/xfade", self.handle_xfade)
+            self.dispatcher.map("/blend", self.handle_blend)
+            self.dispatcher.map("/layer_b", self.handle_layer_b)
+            self.dispatcher.map("/record", self.handle_record)
+            self.dispatcher.map("/screengrab", self.handle_screengrab)
 
             self.server = osc_server.ThreadingOSCUDPServer(("0.0.0.0", 12345), self.dispatcher)
             self.client = udp_client.SimpleUDPClient("127.0.0.1", 12346)
@@ -61,6 +82,13 @@ class OSCManager:
             self.server_thread.daemon = True
             self.running = True
             self.server_thread.start()
+
+            # the web editor sends /set to port 4000 when a mode is saved
+            try:
+                self.editor_server = osc_server.ThreadingOSCUDPServer(("127.0.0.1", 4000), self.dispatcher)
+                threading.Thread(target=self.editor_server.serve_forever, daemon=True).start()
+            except OSError as e:
+                logger.warning(f"OSC editor port unavailable: {e}")
             logger.info("OSC initialized successfully")
             return True
         except Exception as e:
@@ -88,6 +116,44 @@ class OSCManager:
         except ValueError:
             logger.warning(f"Invalid mode index: {value}")
 
+    def handle_set(self, address, path, *args):
+        # path of a mode's main.py, as sent by the web editor
+        name = os.path.basename(os.path.dirname(os.path.normpath(path)))
+        if self.eyesy.set_mode_by_name(name):
+            self.eyesy.reload_mode()
+        else:
+            logger.warning(f"Unknown mode: {path}")
+
+    def handle_reload(self, address, *args):
+        self.eyesy.reload_mode()
+
+    def handle_xfade(self, address, value):
+        try:
+            self.eyesy.mixer_xfade = min(max(float(value), 0.), 1.)
+        except ValueError:
+            logger.warning(f"Invalid crossfade: {value}")
+
+    def handle_blend(self, address, value):
+        try:
+            self.eyesy.mixer_blend = int(value) % len(self.eyesy.BLEND_MODES)
+        except ValueError:
+            logger.warning(f"Invalid blend mode: {value}")
+
+    def handle_layer_b(self, address, value):
+        try:
+            self.eyesy.layer_b_index = int(value) % len(self.eyesy.mode_names)
+        except ValueError:
+            logger.warning(f"Invalid layer B mode index: {value}")
+
+    def handle_screengrab(self, address, *args):
+        self.eyesy.screengrab_flag = True
+
+    def handle_record(self, address, *args):
+        self.eyesy.record_flag = True
+
+    def handle_trace(self, address, *args):
+        self.eyesy.trace_dump_flag = True
+
     def send(self, address, value):
         if self.client:
             try:
@@ -100,6 +166,8 @@ class OSCManager:
         if self.server:
             self.server.shutdown()
             self.server_thread.join(timeout=1.0)
+        if self.editor_server:
+            self.editor_server.shutdown()
         logger.info("OSC closed")
 
 def handle_sigterm(signum, frame):
@@ -159,9 +227,14 @@ def initialize_system():
         eyesy_obj.config = eyesy_obj.DEFAULT_CONFIG
         eyesy_obj.RES = (1280, 720)
 
+    try:
+        midi.init()
+        midi.watch(eyesy_obj)
+    except Exception as e:
+        logger.error(f"MIDI init failed: {e}")
+
     pygame.init()
     pygame.mouse.set_visible(False)
-    clocker = pygame.time.Clock()
 
     try:
         hwscreen = pygame.display.set_mode(eyesy_obj.RES)
@@ -172,18 +245,12 @@ def initialize_system():
         raise
 
     try:
-        BUFFER_SIZE = 100
-        shared_buffer = Array(c_float, BUFFER_SIZE, lock=True)
-        shared_buffer_r = Array(c_float, BUFFER_SIZE, lock=True)
-        write_index = Value('i', 0)
-        gain = Value('f', 0)
-        peak = Value('f', 0)
-        peak_r = Value('f', 0)
-        lock = Lock()
+        audio = audio_ring.AudioRing()
+        atexit.register(audio.close)
 
         audio_process = Process(
             target=sound.audio_processing,
-            args=(shared_buffer, shared_buffer_r, write_index, gain, peak, peak_r, lock)
+            args=(audio.name,)
         )
         audio_process.start()
         logger.info("Audio process started")
@@ -191,13 +258,13 @@ def initialize_system():
         logger.error(f"Audio init failed: {e}")
         raise
 
-    return eyesy_obj, osc, hwscreen, audio_process, shared_buffer, shared_buffer_r, gain, peak, peak_r, lock, clocker
+    return eyesy_obj, osc, hwscreen, audio_process, audio
 
 def main():
     signal.signal(signal.SIGTERM, handle_sigterm)
 
     try:
-        eyesy_obj, osc, hwscreen, audio_process, shared_buffer, shared_buffer_r, gain, peak, peak_r, lock, clocker = initialize_system()
+        eyesy_obj, osc, hwscreen, audio_process, audio = initialize_system()
 
         mode_screen = pygame.Surface((eyesy_obj.xres, eyesy_obj.yres))
         eyesy_obj.screen = mode_screen
@@ -211,8 +278,9 @@ def main():
                         exitexit(0)
                 time.sleep(1)
 
+        eyesy_obj.set_mode_by_index(0)
         init_menu_system(eyesy_obj)
-        run_main_loop(eyesy_obj, osc, hwscreen, mode_screen, shared_buffer, shared_buffer_r, gain, peak, peak_r, lock, clocker)
+        run_main_loop(eyesy_obj, osc, hwscreen, mode_screen, audio)
 
     except Exception as e:
         logger.critical(f"Fatal error: {traceback.format_exc()}")
@@ -232,19 +300,54 @@ def init_menu_system(eyesy_obj):
     }
     eyesy_obj.switch_menu_screen("home")
 
-def run_main_loop(eyesy_obj, osc, hwscreen, mode_screen, shared_buffer, shared_buffer_r, gain, peak, peak_r, lock, clocker):
+def run_main_loop(eyesy_obj, osc, hwscreen, mode_screen, audio):
     start_time = time.time()
     last_usb_check = 0
     last_mode_switch = time.time()
     MODE_SLIDE_INTERVAL = 20
+    PREFETCH_AHEAD = 5
+    timer = frame_timing.FrameTimer()
+    eyesy_obj.frame_timer = timer
+    pacer = create_frame_pacer(eyesy_obj)
+    eyesy_obj.frame_pacer = pacer
+    scaler = render_scale.RenderScaler(hwscreen.get_size(), mode_screen)
+    scaler.enabled = pacer.policy == frame_pacer.POLICY_LOWER_RES
+    eyesy_obj.render_scaler = scaler
+    prefetcher = mode_prefetch.ModePrefetcher(eyesy_obj.mode_registry)
+    eyesy_obj.mode_prefetcher = prefetcher
+    if eyesy_obj.config["isolate_modes"]:
+        eyesy_obj.mode_worker = mode_worker.ModeWorker(eyesy_obj)
+    if eyesy_obj.config["mixer"]:
+        eyesy_obj.mixer = mixer.LayerMixer(eyesy_obj)
+    # mode code only runs in the workers then, prefetch and reload included
+    if eyesy_obj.mixer:
+        workers = eyesy_obj.mixer.layers
+    elif eyesy_obj.mode_worker:
+        workers = [eyesy_obj.mode_worker]
+    else:
+        workers = []
+    reloader = mode_watch.ModeReloader(eyesy_obj.mode_registry, workers)
+    reloader.start()
+    eyesy_obj.mode_reloader = reloader
+    eyesy_obj.mode_transition = transitions.ModeTransition(hwscreen.get_size())
+    eyesy_obj.recorder = recorder.Recorder(eyesy_obj.GRABS_PATH)
+    eyesy_obj.grabber = grabs.ScreenGrabber(eyesy_obj)
 
     while True:
         current_time = time.time()
         eyesy_obj.frame_count += 1
+        timer.begin_frame()
+        pacer.begin()
 
         for event in pygame.event.get():
             if event.type == QUIT or (event.type == KEYDOWN and event.key == K_ESCAPE):
                 exitexit(0)
+            if event.type == KEYDOWN and event.key == K_t:
+                eyesy_obj.trace_dump_flag = True
+            if event.type == KEYDOWN and event.key == K_r:
+                eyesy_obj.record_flag = True
+            if event.type == KEYDOWN and event.key == K_g:
+                eyesy_obj.screengrab_flag = True
 
         if current_time - last_usb_check > 30:
             if usbdrive.check_usb() and not eyesy_obj.running_from_usb:
@@ -252,7 +355,7 @@ def run_main_loop(eyesy_obj, osc, hwscreen, mode_screen, shared_buffer, shared_b
                 exitexit(1)
             last_usb_check = current_time
 
-        update_system_state(eyesy_obj, osc, shared_buffer, shared_buffer_r, gain, peak, peak_r, lock)
+        update_system_state(eyesy_obj, osc, audio)
 
         if not eyesy_obj.menu_mode and (current_time - last_mode_switch) > MODE_SLIDE_INTERVAL:
             eyesy_obj.mode_index = (eyesy_obj.mode_index + 1) % len(eyesy_obj.mode_names)
@@ -260,18 +363,52 @@ def run_main_loop(eyesy_obj, osc, hwscreen, mode_screen, shared_buffer, shared_b
             last_mode_switch = current_time
             logger.info(f"Auto-switched to mode: {eyesy_obj.mode_names[eyesy_obj.mode_index]}")
 
-        handle_mode_rendering(eyesy_obj, hwscreen, mode_screen)
-
-        if eyesy_obj.show_osd and not eyesy_obj.menu_mode:
-            try:
-                osd.render_overlay_480(hwscreen, eyesy_obj)
-            except Exception as e:
-                logger.error(f"OSD error: {e}")
+        # the slideshow's next mode is known, get it ready in the background
+        if not workers and not eyesy_obj.menu_mode and (current_time - last_mode_switch) > MODE_SLIDE_INTERVAL - PREFETCH_AHEAD:
+            next_mode = eyesy_obj.mode_names[(eyesy_obj.mode_index + 1) % len(eyesy_obj.mode_names)]
+            next_size = scaler.size_for(scaler.level_for(next_mode))
+            if not eyesy_obj.mode_registry.is_warm(next_mode, next_size):
+                prefetcher.start(next_mode)
+
+        if not eyesy_obj.menu_mode:
+            reloader.apply(eyesy_obj, hwscreen)
+
+        held = handle_mode_rendering(eyesy_obj, hwscreen)
+
+        # the mode output, before the OSD goes on top
+        if eyesy_obj.screengrab_flag:
+            if eyesy_obj.menu_mode:
+                eyesy_obj.screengrab_flag = False  # no mode output to grab
+            else:
+                eyesy_obj.screengrab()
+        if eyesy_obj.record_flag:
+            eyesy_obj.toggle_recording()
+        if held:
+            eyesy_obj.recorder.repeat()
+        else:
+            eyesy_obj.recorder.capture(hwscreen)
+
+        osd_rects = []
+        if eyesy_obj.show_osd and not eyesy_obj.menu_mode and not pacer.skip_osd:
+            with timer.phase("osd"):
+                try:
+                    osd_rects = osd.render_overlay_480(hwscreen, eyesy_obj)
+                except Exception as e:
+                    logger.error(f"OSD error: {e}")
 
         if eyesy_obj.menu_mode:
-            handle_menu_system(eyesy_obj, hwscreen)
+            with timer.phase("menu"):
+                handle_menu_system(eyesy_obj, hwscreen)
+
+        with timer.phase("flip"):
+            # a held frame is already on screen, only push what the OSD changed
+            if held:
+                pygame.display.update(osd_rects)
+            else:
+                pygame.display.flip()
 
-        pygame.display.flip()
+        if eyesy_obj.trace_dump_flag:
+            eyesy_obj.dump_frame_trace()
 
         if eyesy_obj.frame_count % 30 == 0:
             elapsed = current_time - start_time
@@ -281,65 +418,192 @@ def run_main_loop(eyesy_obj, osc, hwscreen, mode_screen, shared_buffer, shared_b
         if eyesy_obj.frame_count % 300 == 0:
             gc.collect()
 
-        clocker.tick(30)
-
-def update_system_state(eyesy_obj, osc, shared_buffer, shared_buffer_r, gain, peak, peak_r, lock):
-    eyesy_obj.update_knobs_and_notes()
-    eyesy_obj.check_gain_knob()
-    eyesy_obj.knob_seq_run()
-    eyesy_obj.set_knobs()
-
-    if eyesy_obj.new_led:
-        osc.send("/led", eyesy_obj.led)
-        eyesy_obj.new_led = False
-
-    process_audio(eyesy_obj, shared_buffer, shared_buffer_r, gain, peak, peak_r, lock)
-
-def process_audio(eyesy_obj, shared_buffer, shared_buffer_r, gain, peak, peak_r, lock):
+        # this frame's triggers and note changes have been seen
+        eyesy_obj.clear_flags()
+
+        if not workers:
+            next_size = scaler.size_for(scaler.level_for(prefetcher.name))
+            prefetcher.step(eyesy_obj, hwscreen, next_size, time.perf_counter() - pacer.frame_start, pacer.period)
+        pacer.wait()
+        scaler.update(pacer.cost, pacer.period)
+
+def create_frame_pacer(eyesy_obj):
+    fps = eyesy_obj.config["frame_rate"]
+    if fps == 0:
+        fps = frame_pacer.composite_field_rate(get_tv_norm())
+    eyesy_obj.target_fps = fps
+    logger.info(f"Frame rate: {fps} fps")
+    return frame_pacer.FramePacer(fps, eyesy_obj.config["overbudget_policy"])
+
+def update_system_state(eyesy_obj, osc, audio):
+    timer = eyesy_obj.frame_timer
+    with timer.phase("state"):
+        midi.drain(eyesy_obj)
+        eyesy_obj.update_knobs_and_notes()
+        eyesy_obj.check_gain_knob()
+        eyesy_obj.knob_seq_run()
+        eyesy_obj.set_knobs()
+
+        if eyesy_obj.new_led:
+            osc.send("/led", eyesy_obj.led)
+            eyesy_obj.new_led = False
+
+    with timer.phase("audio"):
+        process_audio(eyesy_obj, audio)
+
+def process_audio(eyesy_obj, audio):
     if not eyesy_obj.key10_status:
-        with lock:
-            eyesy_obj.audio_in[:] = shared_buffer[:]
-            eyesy_obj.audio_in_r[:] = shared_buffer_r[:]
-            g = eyesy_obj.config["audio_gain"]
-            gain.value = float((g * g * 50) + 1)
-            eyesy_obj.audio_peak = peak.value
-            eyesy_obj.audio_peak_r = peak_r.value
-
-            if eyesy_obj.config["trigger_source"] in (0, 2):
-                if eyesy_obj.audio_peak > 20000 or eyesy_obj.audio_peak_r > 20000:
-                    eyesy_obj.trig = True
-
-def handle_mode_rendering(eyesy_obj, hwscreen, mode_screen):
+        g = eyesy_obj.config["audio_gain"]
+        audio.gain[0] = (g * g * 50) + 1
+
+        onsets = eyesy_obj.onset_count
+        # a copy that overlaps a write is retried a few times, never waited out
+        if audio.read():
+            last = audio.last
+            np.copyto(eyesy_obj.audio_in, last["levels"][0])
+            np.copyto(eyesy_obj.audio_in_r, last["levels"][1])
+            np.copyto(eyesy_obj.audio_fft, last["fft"])
+            np.copyto(eyesy_obj.audio_bands, last["bands"])
+            np.copyto(eyesy_obj.audio_pitch, last["pitch"])
+            np.copyto(eyesy_obj.audio_note, last["note"])
+            np.copyto(eyesy_obj.audio_pitch_confidence, last["pitch_confidence"])
+            eyesy_obj.audio_peak, eyesy_obj.audio_peak_r = last["peak"].tolist()
+            onsets = int(last["onset_count"][0])
+            beat_time = float(last["beat_time"][0])
+            eyesy_obj.audio_bpm = float(last["bpm"][0])
+            if eyesy_obj.audio_bpm and beat_time:
+                eyesy_obj.beat_phase = ((time.monotonic() - beat_time) * eyesy_obj.audio_bpm / 60.) % 1.
+        # every onset since the last frame counts, however short the hit
+        eyesy_obj.audio_onset = onsets != eyesy_obj.onset_count
+        eyesy_obj.onset_count = onsets
+
+        ts = eyesy_obj.config["trigger_source"]
+        if ts in (0, 2):
+            if eyesy_obj.audio_peak > 20000 or eyesy_obj.audio_peak_r > 20000:
+                eyesy_obj.trig = True
+        elif ts == 7 and eyesy_obj.audio_onset:
+            eyesy_obj.trig = True
+
+def handle_mode_rendering(eyesy_obj, hwscreen):
+    """Draw and present the current mode, returns True if the previous frame was held."""
+    timer = eyesy_obj.frame_timer
+    scaler = eyesy_obj.render_scaler
+    transition = eyesy_obj.mode_transition
+    if eyesy_obj.run_setup and not eyesy_obj.menu_mode:
+        transition.begin(hwscreen, eyesy_obj.mode, eyesy_obj.TRANSITIONS[eyesy_obj.config["transition"]],
+                         eyesy_obj.config["transition_time"], eyesy_obj.target_fps)
+    # draw straight into the display when there is nothing to composite on top
+    direct = not (eyesy_obj.menu_mode or eyesy_obj.show_osd or transition.active)
+    registry = eyesy_obj.mode_registry
+    if eyesy_obj.mixer:
+        return render_mixed(eyesy_obj, hwscreen)
+    if eyesy_obj.mode_worker:
+        return render_in_worker(eyesy_obj, hwscreen)
+    mode_screen = scaler.select_target(eyesy_obj, hwscreen, direct)
     if not eyesy_obj.menu_mode:
         try:
-            mode = sys.modules.get(eyesy_obj.mode)
-            if mode is None:
-                raise ImportError(f"Mode {eyesy_obj.mode} not loaded")
+            mode = registry.get(eyesy_obj.mode)
+
+            # over budget last frame, leave the previous frame on screen
+            if eyesy_obj.frame_pacer.hold_frame and not eyesy_obj.run_setup:
+                return True
+
+            if eyesy_obj.run_setup:
+                scaler.begin_mode(eyesy_obj)
+                mode_screen = scaler.select_target(eyesy_obj, hwscreen, direct)
 
             if eyesy_obj.auto_clear:
                 mode_screen.fill(eyesy_obj.bg_color)
 
             if eyesy_obj.run_setup:
+                with timer.phase("setup"):
+                    if registry.is_warm(eyesy_obj.mode, (eyesy_obj.xres, eyesy_obj.yres)):
+                        registry.touch(eyesy_obj.mode)
+                    else:
+                        try:
+                            with eyesy_obj.mode_prefetcher.preloaded(eyesy_obj, eyesy_obj.mode):
+                                registry.setup(eyesy_obj.mode, hwscreen, eyesy_obj)
+                        except Exception as e:
+                            logger.error(f"Mode setup failed: {e}")
+                    eyesy_obj.run_setup = False
+
+            with timer.phase("draw"):
                 try:
-                    mode.setup(hwscreen, eyesy_obj)
+                    mode.draw(mode_screen, eyesy_obj)
                 except Exception as e:
-                    logger.error(f"Mode setup failed: {e}")
-                eyesy_obj.run_setup = False
-
-            try:
-                mode.draw(mode_screen, eyesy_obj)
-            except Exception as e:
-                logger.error(f"Mode draw failed: {e}")
-                mode_screen.fill((50, 50, 50))
-                font = pygame.font.SysFont(None, 48)
-                text = font.render("Mode Error", True, (255, 0, 0))
-                mode_screen.blit(text, (50, 50))
+                    logger.error(f"Mode draw failed: {e}")
+                    mode_screen.fill((50, 50, 50))
+                    font = pygame.font.SysFont(None, 48)
+                    text = font.render("Mode Error", True, (255, 0, 0))
+                    mode_screen.blit(text, (50, 50))
 
-            hwscreen.blit(mode_screen, (0, 0))
+            with timer.phase("blit"):
+                scaler.present(hwscreen)
+                transition.apply(hwscreen)
 
         except Exception as e:
             logger.error(f"Mode handling failed: {e}")
             eyesy_obj.error = str(e)
+    return False
+
+def render_in_worker(eyesy_obj, hwscreen):
+    """Present the mode running in the worker process, returns True if the previous frame was held."""
+    timer = eyesy_obj.frame_timer
+    scaler = eyesy_obj.render_scaler
+    worker = eyesy_obj.mode_worker
+    if eyesy_obj.menu_mode:
+        return False
+
+    if eyesy_obj.run_setup:
+        scaler.begin_mode(eyesy_obj)
+        worker.set_mode(eyesy_obj.mode, eyesy_obj.mode_root, (eyesy_obj.xres, eyesy_obj.yres))
+        eyesy_obj.run_setup = False
+
+    with timer.phase("draw"):
+        slot = worker.frame(eyesy_obj, eyesy_obj.frame_pacer.period)
+    if slot is None:
+        return True
+
+    with timer.phase("blit"):
+        # straight into the display at full size, else through the scaler
+        if scaler.level == 0:
+            worker.present(slot, hwscreen)
+            eyesy_obj.screen = hwscreen
+        else:
+            worker.present(slot, scaler.surface)
+            scaler.present(hwscreen)
+            eyesy_obj.screen = scaler.surface
+        eyesy_obj.mode_transition.apply(hwscreen)
+    return False
+
+def render_mixed(eyesy_obj, hwscreen):
+    """Composite the two mixer layers, returns True if the previous frame was held."""
+    timer = eyesy_obj.frame_timer
+    scaler = eyesy_obj.render_scaler
+    mix = eyesy_obj.mixer
+    if eyesy_obj.menu_mode:
+        return False
+
+    if eyesy_obj.run_setup:
+        scaler.begin_mode(eyesy_obj)
+        mix.set_layer(0, eyesy_obj.mode, (eyesy_obj.xres, eyesy_obj.yres))
+        eyesy_obj.run_setup = False
+    layer_b = eyesy_obj.mode_names[eyesy_obj.layer_b_index % len(eyesy_obj.mode_names)]
+    if layer_b != mix.layer_modes[1]:
+        mix.set_layer(1, layer_b, (eyesy_obj.xres, eyesy_obj.yres))
+
+    target = hwscreen if scaler.level == 0 else scaler.surface
+    with timer.phase("draw"):
+        drawn = mix.render(eyesy_obj, eyesy_obj.frame_pacer.period, target)
+    if not drawn:
+        return True
+
+    with timer.phase("blit"):
+        if target is not hwscreen:
+            scaler.present(hwscreen)
+        eyesy_obj.mode_transition.apply(hwscreen)
+    eyesy_obj.screen = target
+    return False
 
 def handle_menu_system(eyesy_obj, hwscreen):
     try:
@@ -1,18 +1,38 @@
 import time
+import threading
 import traceback
+from collections import deque
 import mido
 
 input_port = None
 input_port_usb = None
-midi_clock_count = 0
 
-def _handle_note(eyesy, message):
+# (time.monotonic(), port label, message) appended by the ports' callback
+# threads and drained by the render loop; deque append/popleft need no lock
+events = deque()
+# per port: events received and events/s over the last second
+port_stats = {}
+# events waiting at the last drain, and the most ever waiting
+queue_depth = 0
+max_queue_depth = 0
+STATS_INTERVAL = 1.
+HOTPLUG_INTERVAL = 2.  # seconds between USB MIDI port scans
+_stats_time = 0.
+_stats_counts = {}
+
+def _handle_note(eyesy, message, when):
     #print(f"Note message: {message}")
     if (message.channel + 1) == eyesy.config["midi_channel"]:
         num = message.note 
         val = message.velocity
-        if val > 0 :
+        eyesy.midi_notes_changed[num] = True
+        eyesy.midi_note_new = True
+        eyesy.midi_note_changes += 1
+        # note_off carries a release velocity, it is still an off
+        if message.type == 'note_on' and val > 0 :
             eyesy.midi_notes[num] = 1
+            eyesy.midi_velocity[num] = val
+            eyesy.midi_note_on_time[num] = when
             # 1 is trigger source for note, 2 for notes or audio
             if eyesy.config["trigger_source"] == 1 or eyesy.config["trigger_source"] == 2: eyesy.trig = True 
             # select mode from note 
@@ -21,30 +41,102 @@ def _handle_note(eyesy, message):
                 eyesy.set_mode_by_index(eyesy.mode_index)
         else :
             eyesy.midi_notes[num] = 0
+            eyesy.midi_velocity[num] = 0
+            eyesy.midi_note_off_time[num] = when
+
+# CC number -> handlers, built from config by build_cc_table
+cc_table = None
+cc_channel = 1
+knob_msb = [0] * 5
+
+def _knob(i):
+    def handler(eyesy, val):
+        if not eyesy.menu_mode: # don't update knobs in menu mode (interferes with test)
+            knob_msb[i] = val
+            eyesy.knob_hardware[i] = val / 127.
+    return handler
+
+def _knob_14bit(i):
+    # MSB alone gives the coarse value, the LSB that follows refines it
+    def msb(eyesy, val):
+        if not eyesy.menu_mode:
+            knob_msb[i] = val
+            eyesy.knob_hardware[i] = (val << 7) / 16383.
+    def lsb(eyesy, val):
+        if not eyesy.menu_mode:
+            eyesy.knob_hardware[i] = ((knob_msb[i] << 7) | val) / 16383.
+    return msb, lsb
+
+def _auto_clear(eyesy, val):
+    if val > 64 :
+        eyesy.auto_clear = True
+    else:
+        eyesy.auto_clear = False
+
+def _fg_palette(eyesy, val):
+    eyesy.fg_palette = val % len(eyesy.palettes)
+
+def _bg_palette(eyesy, val):
+    eyesy.bg_palette = val % len(eyesy.palettes)
+
+def _mode(eyesy, val):
+    eyesy.mode_index = val % len(eyesy.mode_names)
+    eyesy.set_mode_by_index(eyesy.mode_index)
+
+def _mixer_xfade(eyesy, val):
+    eyesy.mixer_xfade = val / 127.
+
+def _mixer_blend(eyesy, val):
+    eyesy.mixer_blend = val * len(eyesy.BLEND_MODES) // 128
+
+def _layer_b(eyesy, val):
+    eyesy.layer_b_index = val % len(eyesy.mode_names)
+
+CC_HANDLERS = [
+    ("auto_clear_cc", _auto_clear),
+    ("fg_palette_cc", _fg_palette),
+    ("bg_palette_cc", _bg_palette),
+    ("mode_cc", _mode),
+    ("mixer_xfade_cc", _mixer_xfade),
+    ("mixer_blend_cc", _mixer_blend),
+    ("layer_b_cc", _layer_b),
+]
+
+def build_cc_table(eyesy):
+    """Map each CC number to its handlers, call again whenever the MIDI settings change."""
+    global cc_table, cc_channel
+    table = [[] for _ in range(128)]
+    config = eyesy.config
+    lsb_slots = {}
+    for i in range(5):
+        cc = config[f"knob{i + 1}_cc"]
+        if not 0 <= cc < 128:
+            continue
+        # 14 bit pairs are CC n (MSB) with CC n + 32 (LSB), for n below 32
+        if config["knob_14bit"] and cc < 32:
+            msb, lsb = _knob_14bit(i)
+            table[cc].append(msb)
+            lsb_slots[cc + 32] = lsb
+        else:
+            table[cc].append(_knob(i))
+    for key, handler in CC_HANDLERS:
+        cc = config[key]
+        if 0 <= cc < 128:
+            table[cc].append(handler)
+    # an LSB slot that is mapped to something else belongs to that
+    for cc, lsb in lsb_slots.items():
+        if not table[cc]:
+            table[cc].append(lsb)
+    cc_table = [tuple(handlers) for handlers in table]
+    cc_channel = config["midi_channel"]
 
 def _handle_control_change(eyesy, message):
     #print(f"Control Change message: {message}")
-    if (message.channel + 1) == eyesy.config["midi_channel"]:
-        num = message.control
-        val = message.value
-        if not eyesy.menu_mode : # don't update knobs in menu mode (interferes with test)
-            if message.control == eyesy.config["knob1_cc"] : eyesy.knob_hardware[0] = val / 127.
-            if message.control == eyesy.config["knob2_cc"] : eyesy.knob_hardware[1] = val / 127.
-            if message.control == eyesy.config["knob3_cc"] : eyesy.knob_hardware[2] = val / 127.
-            if message.control == eyesy.config["knob4_cc"] : eyesy.knob_hardware[3] = val / 127.
-            if message.control == eyesy.config["knob5_cc"] : eyesy.knob_hardware[4] = val / 127.
-        if message.control == eyesy.config["auto_clear_cc"] : 
-            if val > 64 :
-                eyesy.auto_clear = True
-            else:
-                eyesy.auto_clear = False
-        if message.control == eyesy.config["fg_palette_cc"] : 
-            eyesy.fg_palette = val % len(eyesy.palettes)
-        if message.control == eyesy.config["bg_palette_cc"] : 
-            eyesy.bg_palette = val % len(eyesy.palettes)
-        if message.control == eyesy.config["mode_cc"] : 
-            eyesy.mode_index = val % len(eyesy.mode_names)
-            eyesy.set_mode_by_index(eyesy.mode_index)
+    if cc_table is None:
+        build_cc_table(eyesy)
+    if (message.channel + 1) == cc_channel:
+        for handler in cc_table[message.control]:
+            handler(eyesy, message.value)
        
 def _handle_program_change(eyesy, message):
     #print(f"Program Change message: {message}")
@@ -54,45 +146,175 @@ def _handle_program_change(eyesy, message):
             print(f"attempting to load scene {scene}")
             eyesy.recall_scene_by_name(scene)
 
-def _handle_clock(eyesy, message):
-    global midi_clock_count
+PULSES_PER_BEAT = 24
+BEATS_PER_BAR = 4
+CLOCK_WINDOW = 48      # pulses the tempo is measured over, two beats
+CLOCK_TIMEOUT = .5     # seconds without a pulse before the clock counts as gone
+
+class ClockTracker:
+    """Follows incoming MIDI clock: tempo, transport and song position.
+
+    The pulse interval is the time spanned by the last CLOCK_WINDOW pulses
+    divided by their count, so USB and serial jitter on any one pulse is
+    spread over two beats and a tempo change is followed within two
+    beats.  Between pulses the position is extrapolated from that
+    interval, so beat and bar phase move smoothly every frame.
+
+    Most sequencers keep sending clock while stopped.  The tempo still
+    follows it but the position only advances while the transport runs,
+    or always if no Start or Continue was ever seen (a free-running clock),
+    so Continue picks up where Stop left off.
+    """
+
+    def __init__(self):
+        self.pulse = 0
+        self.last = 0.
+        self.interval = 0.
+        self.times = deque(maxlen=CLOCK_WINDOW)
+        self.running = False
+        self.transport = False  # a Start or Continue has been seen
+
+    @property
+    def advancing(self):
+        return self.running or not self.transport
+
+    def clock(self, when):
+        """Count a pulse, returns True if it moved the position on."""
+        if self.last and when - self.last > CLOCK_TIMEOUT:
+            self.times.clear()  # the clock stopped, old pulses say nothing about the new tempo
+        self.times.append(when)
+        if len(self.times) > 1:
+            self.interval = (self.times[-1] - self.times[0]) / (len(self.times) - 1)
+        self.last = when
+        if not self.advancing:
+            return False
+        self.pulse += 1
+        return True
+
+    def start(self):
+        self.pulse = 0
+        self.running = self.transport = True
+
+    def stop(self):
+        self.running = False
+        self.transport = True
+
+    def resume(self):
+        self.running = self.transport = True
+
+    def song_position(self, pos):
+        # song position counts 16th notes, 6 pulses each
+        self.pulse = pos * 6
+
+    @property
+    def bpm(self):
+        return 60. / (self.interval * PULSES_PER_BEAT) if self.interval else 0.
+
+    def position(self, now):
+        """Beats since the start, extrapolated up to the next pulse."""
+        # pulse counts pulses received, the last one marks pulse - 1
+        position = self.pulse - 1
+        if self.advancing and self.interval and now - self.last < CLOCK_TIMEOUT:
+            position += min((now - self.last) / self.interval, .999)
+        return max(position, 0) / PULSES_PER_BEAT
+
+    def update(self, eyesy, now):
+        """Publish tempo, transport and phase to eyesy, once per frame.
+
+        The phases hold still while the transport is stopped or the clock is gone.
+        """
+        alive = now - self.last <= CLOCK_TIMEOUT
+        eyesy.midi_clock_running = alive and self.running
+        if not alive:
+            eyesy.midi_bpm = 0.
+            return
+        eyesy.midi_bpm = self.bpm
+        if self.advancing:
+            beats = self.position(now)
+            eyesy.midi_beat_phase = beats % 1.
+            eyesy.midi_bar_phase = (beats / BEATS_PER_BAR) % 1.
+
+clock = ClockTracker()
+
+def _handle_clock(eyesy, message, when):
+    # trigger on the pulse about to be counted, 0 right after Start
+    count = clock.pulse
+    if not clock.clock(when):
+        return  # transport stopped
     ts = eyesy.config["trigger_source"]
     # 3,4,5,6 of trigger source are midi clock selections
     if ts > 2:
         if ts == 3:
-            if (midi_clock_count % 6) == 0: eyesy.trig = True
+            if (count % 6) == 0: eyesy.trig = True
         elif ts == 4:
-            if (midi_clock_count % 12) == 0: eyesy.trig = True
+            if (count % 12) == 0: eyesy.trig = True
         elif ts == 5:
-            if (midi_clock_count % 24) == 0: eyesy.trig = True
+            if (count % 24) == 0: eyesy.trig = True
         elif ts == 6:
-            if (midi_clock_count % 96) == 0: eyesy.trig = True
-    midi_clock_count += 1
+            if (count % 96) == 0: eyesy.trig = True
+
+def _receiver(label):
+    port_stats.setdefault(label, {"events": 0, "rate": 0.})
+    def callback(message):
+        events.append((time.monotonic(), label, message))
+        port_stats[label]["events"] += 1
+    return callback
 
 def init():
-    global input_port, input_port_usb
+    global input_port
 
     # first ttymidi
     try:
-        input_port = mido.open_input('ttymidi:MIDI in 128:0') 
+        input_port = mido.open_input('ttymidi:MIDI in 128:0', callback=_receiver("ttymidi"))
     except Exception as e:
         print(f"Error initializing ttymidi input port: {e}")
         input_port = None
 
     # try to get a USB midi port
+    if not scan_usb():
+        print(f"USB MIDI not found")
+
+def scan_usb(eyesy=None):
+    """Close the USB port if it was unplugged and open one if none is open, returns True if one is open."""
+    global input_port_usb
     input_ports = mido.get_input_names()
-    print(input_ports)
-    valid_port = next((port for port in input_ports if not port.startswith(("Midi Through", "ttymidi", "System"))), None)
-    if valid_port != None:
+    if input_port_usb and input_port_usb.name not in input_ports:
+        print(f"USB MIDI unplugged: {input_port_usb.name}")
         try:
-            print(f"trying to open: {valid_port}")
-            input_port_usb = mido.open_input(valid_port) 
+            input_port_usb.close()
         except Exception as e:
-            print(f"Error initializing midi input port: {e}")
-            input_port_usb = None
-    else :
-        print(f"USB MIDI not found")
-    
+            print(f"Error closing USB MIDI input port: {e}")
+        input_port_usb = None
+    if input_port_usb is None:
+        valid_port = next((port for port in input_ports if not port.startswith(("Midi Through", "ttymidi", "System"))), None)
+        if valid_port != None:
+            try:
+                print(f"trying to open: {valid_port}")
+                input_port_usb = mido.open_input(valid_port, callback=_receiver("usb"))
+            except Exception as e:
+                print(f"Error initializing midi input port: {e}")
+                input_port_usb = None
+    if eyesy:
+        eyesy.usb_midi_device = input_port_usb
+        eyesy.usb_midi_name = input_port_usb.name if input_port_usb else ''
+        eyesy.usb_midi_present = input_port_usb is not None
+    return input_port_usb is not None
+
+def watch(eyesy):
+    """Pick up USB MIDI plugged in or pulled out, on a background thread.
+
+    Listing ports goes through the ALSA sequencer and can take a while, so
+    it never runs on the render loop.
+    """
+    def run():
+        while True:
+            try:
+                scan_usb(eyesy)
+            except Exception as e:
+                print(f"Error scanning for USB MIDI: {e}")
+            time.sleep(HOTPLUG_INTERVAL)
+    threading.Thread(target=run, daemon=True).start()
+
 def close():
     global input_port, input_port_usb
 
@@ -104,36 +326,53 @@ def close():
             except Exception as e:
                 print(f"Error closing {name} input port: {e}")
 
-def recv(eyesy, input_port):
-    if not input_port:
-        #print("Input port is not initialized.")
-        return
-
+def dispatch(eyesy, message, when):
     try:
-        messages = []
-        for message in input_port.iter_pending():  # Non-blocking iteration
-            messages.append(message)
-
-        for message in messages:
-            try:
-                if message.type == 'clock':
-                    _handle_clock(eyesy, message)
-                if message.type == 'note_on' or message.type == 'note_off':
-                    _handle_note(eyesy, message)
-                elif message.type == 'control_change':
-                    _handle_control_change(eyesy, message)
-                elif message.type == 'program_change':
-                    _handle_program_change(eyesy, message)
-            except Exception as e:
-                print(traceback.format_exc())
-                print(f"Error processing message {message}: {e}")
+        if message.type == 'clock':
+            _handle_clock(eyesy, message, when)
+        elif message.type == 'start':
+            clock.start()
+        elif message.type == 'stop':
+            clock.stop()
+        elif message.type == 'continue':
+            clock.resume()
+        elif message.type == 'songpos':
+            clock.song_position(message.pos)
+        elif message.type == 'note_on' or message.type == 'note_off':
+            _handle_note(eyesy, message, when)
+        elif message.type == 'control_change':
+            _handle_control_change(eyesy, message)
+        elif message.type == 'program_change':
+            _handle_program_change(eyesy, message)
     except Exception as e:
-        print(f"Error receiving messages: {e}")
+        print(traceback.format_exc())
+        print(f"Error processing message {message}: {e}")
 
-def recv_ttymidi(eyesy):
-    global input_port
-    recv(eyesy, input_port)
+def drain(eyesy):
+    """Apply everything received since the last frame, in arrival order.
 
-def recv_usbmidi(eyesy):
-    global input_port_usb
-    recv(eyesy, input_port_usb)
+    Call once per frame.  Messages arrive on the ports' own threads, so a
+    slow frame delays them but never drops them.
+    """
+    global _stats_time, queue_depth, max_queue_depth
+    queue_depth = len(events)
+    max_queue_depth = max(max_queue_depth, queue_depth)
+    # only what is queued now, anything arriving meanwhile waits for the next frame
+    for _ in range(queue_depth):
+        when, label, message = events.popleft()
+        eyesy.new_midi = True
+        dispatch(eyesy, message, when)
+
+    now = time.monotonic()
+    clock.update(eyesy, now)
+    if not _stats_time:
+        _stats_time = now
+    elif now - _stats_time >= STATS_INTERVAL:
+        for label, stats in port_stats.items():
+            stats["rate"] = (stats["events"] - _stats_counts.get(label, 0)) / (now - _stats_time)
+            _stats_counts[label] = stats["events"]
+        _stats_time = now
+        # published for the MIDI settings screen and anything else watching
+        eyesy.midi_rates = {label: stats["rate"] for label, stats in port_stats.items()}
+    eyesy.midi_queue_depth = queue_depth
+    eyesy.midi_max_queue_depth = max_queue_depth
@@ -0,0 +1,82 @@
+import os
+import pygame
+from mode_worker import ModeWorker
+
+class LayerMixer:
+    """Two modes at once, each in its own worker process, blended together.
+
+    Layer A is the current mode, layer B is picked separately.  The output
+    is A crossfaded towards blend(A, B) by eyesy.mixer_xfade; for "Mix" the
+    blend is just B, so the fader goes from A to B.  All blending is done
+    with surface blit flags, no per-pixel Python.
+    """
+
+    def __init__(self, eyesy):
+        self.eyesy = eyesy
+        self.layers = [ModeWorker(eyesy), ModeWorker(eyesy)]
+        self.layer_modes = [None, None]
+        self.size = None
+
+    def resize(self, size):
+        if size == self.size:
+            return
+        self.size = size
+        self.a = pygame.Surface(size)
+        self.b = pygame.Surface(size)
+        self.tmp = pygame.Surface(size)
+        self.tmp2 = pygame.Surface(size)
+
+    def set_layer(self, index, name, size):
+        self.layer_modes[index] = name
+        changed = [index]
+        if size != self.size:
+            # both layers draw at the mix size
+            self.resize(size)
+            changed = [0, 1]
+        for i in changed:
+            if self.layer_modes[i]:
+                self.layers[i].set_mode(self.layer_modes[i], os.path.join(self.eyesy.MODES_PATH, self.layer_modes[i]), size)
+
+    def render(self, eyesy, period, target):
+        """Collect both layers and composite into target, returns False if neither had a frame yet."""
+        slots = [layer.frame(eyesy, period) if name else None for layer, name in zip(self.layers, self.layer_modes)]
+        if slots[0] is None and slots[1] is None:
+            return False
+        if slots[0] is not None: self.layers[0].present(slots[0], self.a)
+        if slots[1] is not None: self.layers[1].present(slots[1], self.b)
+
+        target.blit(self.a, (0, 0))
+        blended = self.blend(eyesy.BLEND_MODES[eyesy.mixer_blend])
+        blended.set_alpha(int(eyesy.mixer_xfade * 255))
+        target.blit(blended, (0, 0))
+        blended.set_alpha(None)
+        return True
+
+    def blend(self, mode):
+        a, b, tmp = self.a, self.b, self.tmp
+        if mode == "Mix":
+            return b
+        if mode == "Add":
+            tmp.blit(a, (0, 0))
+            tmp.blit(b, (0, 0), special_flags=pygame.BLEND_ADD)
+        elif mode == "Multiply":
+            tmp.blit(a, (0, 0))
+            tmp.blit(b, (0, 0), special_flags=pygame.BLEND_MULT)
+        elif mode == "Screen":
+            # a + b * (255 - a) / 255, never overflows
+            tmp.fill((255, 255, 255))
+            tmp.blit(a, (0, 0), special_flags=pygame.BLEND_SUB)
+            tmp.blit(b, (0, 0), special_flags=pygame.BLEND_MULT)
+            tmp.blit(a, (0, 0), special_flags=pygame.BLEND_ADD)
+        elif mode == "Difference":
+            # saturating a - b plus saturating b - a
+            tmp.blit(a, (0, 0))
+            tmp.blit(b, (0, 0), special_flags=pygame.BLEND_SUB)
+            self.tmp2.blit(b, (0, 0))
+            self.tmp2.blit(a, (0, 0), special_flags=pygame.BLEND_SUB)
+            tmp.blit(self.tmp2, (0, 0), special_flags=pygame.BLEND_ADD)
+        return tmp
+
+    def stop(self):
+        for layer in self.layers:
+            layer.stop()
@@ -0,0 +1,105 @@
+import os
+import glob
+import time
+import threading
+import contextlib
+import pygame
+
+SLICE_TIME = .003   # main thread time spent on prefetch work per frame
+HEADROOM = .5       # only work on frames that used less than this much of the budget
+
+class ModePrefetcher:
+    """Gets the next slideshow mode ready before the switch.
+
+    A background thread imports the mode and decodes its Images/*.png,
+    which setup() picks up through eyesy.load_image().  The
+    parts that have to happen on the main thread, converting the images to
+    the display format and running setup(), are done a slice per frame on
+    frames with headroom, so the switch finds the mode warm.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.name = None
+        self.state = "idle"
+        self.images = {}
+        self.pending = []
+        self.thread = None
+
+    def start(self, name):
+        if name == self.name:
+            return
+        self.name = name
+        self.images = {}
+        self.pending = []
+        self.state = "loading"
+        self.thread = threading.Thread(target=self._load, args=(name,), daemon=True)
+        self.thread.start()
+
+    def _load(self, name):
+        try:
+            self.registry.get(name)
+            images = {}
+            root = os.path.join(self.registry.modes_path, name)
+            for path in sorted(glob.glob(os.path.join(root, "Images", "*.png"))):
+                images[os.path.abspath(path)] = pygame.image.load(path)
+        except Exception as e:
+            print(f"Prefetch of {name} failed: {e}")
+            images = {}
+        if name == self.name:
+            self.images = images
+            self.pending = list(images)
+            self.state = "converting"
+
+    def step(self, eyesy, hwscreen, size, frame_cost, period):
+        """Do one slice of main thread work, if this frame can afford it."""
+        if self.state not in ("converting", "setup") or frame_cost > period * HEADROOM:
+            return
+        start = time.perf_counter()
+        while self.pending and time.perf_counter() - start < SLICE_TIME:
+            path = self.pending.pop()
+            img = self.images[path]
+            # palette images stay as they are, modes read the palette
+            if img.get_bitsize() > 8:
+                if img.get_flags() & pygame.SRCALPHA:
+                    self.images[path] = img.convert_alpha()
+                else:
+                    self.images[path] = img.convert()
+        if self.state == "converting" and not self.pending:
+            self.state = "setup"
+        elif self.state == "setup":
+            self._setup(eyesy, hwscreen, size)
+
+    def _setup(self, eyesy, hwscreen, size):
+        # setup() sees the eyesy it will run with, then the running mode's state goes back
+        name = self.name
+        registry = self.registry
+        running = eyesy.mode
+        self.state = "done"
+        # the mode on screen is never evicted for a prefetch
+        if running in registry.warm and registry.warm[running][1] >= registry.budget:
+            print(f"Prefetch of {name} skipped, {running} fills the mode cache")
+            return
+        saved = (eyesy.mode, eyesy.mode_root, eyesy.xres, eyesy.yres)
+        eyesy.mode = name
+        eyesy.mode_root = os.path.join(registry.modes_path, name)
+        eyesy.xres, eyesy.yres = size
+        try:
+            with self.preloaded(eyesy, name):
+                registry.setup(name, hwscreen, eyesy, keep=(running,))
+            if not registry.fits():
+                print(f"Prefetch of {name} dropped, it only fits alongside {running} over budget")
+                registry.evict(name)
+        except Exception as e:
+            print(f"Prefetch setup of {name} failed: {e}")
+        finally:
+            eyesy.mode, eyesy.mode_root, eyesy.xres, eyesy.yres = saved
+
+    @contextlib.contextmanager
+    def preloaded(self, eyesy, name):
+        """Offer the prefetched images to eyesy.load_image while a mode sets up."""
+        eyesy.preloaded_images = self.images if name == self.name else {}
+        try:
+            yield
+        finally:
+            eyesy.preloaded_images = {}
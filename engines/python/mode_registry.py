@@ -0,0 +1,128 @@
+import os
+import re
+import sys
+import zlib
+import threading
+import importlib.util
+from collections import OrderedDict
+import psutil
+
+MAX_WARM = 8  # modes kept set up at once, on top of the memory budget
+
+class ModeRegistry:
+    """Discovers Modes/<name>/main.py and keeps recently used modes warm.
+
+    Each mode is imported under its own module name, so two modes can't
+    clobber each other in sys.modules, and the normal import machinery
+    caches their bytecode.  Modes whose setup() has run stay resident in an
+    LRU bounded by MAX_WARM and a memory budget; switching back to one of
+    them skips setup() entirely.
+    """
+
+    def __init__(self, modes_path, budget_mb=128):
+        self.modes_path = modes_path
+        self.budget = budget_mb * 1024 * 1024
+        self.names = []
+        self.modules = {}
+        self.warm = OrderedDict()  # name -> (setup size, resident bytes)
+        self.process = psutil.Process()
+        self.lock = threading.RLock()  # modes may be imported off the main thread
+
+    def discover(self):
+        names = []
+        for name in sorted(os.listdir(self.modes_path)):
+            if os.path.isfile(self.main_path(name)):
+                names.append(name)
+        self.names = names
+        return names
+
+    def main_path(self, name):
+        return os.path.join(self.modes_path, name, "main.py")
+
+    def module_name(self, name):
+        # unique and importable, whatever characters the folder name has
+        return "mode_%s_%08x" % (re.sub(r"\W", "_", name), zlib.crc32(name.encode()))
+
+    def build(self, name, fresh=False):
+        """Import a fresh copy of a mode without registering it (exceptions propagate).
+
+        fresh compiles straight from source, for files that were just edited
+        and could be older than a bytecode cache stamped in the same second.
+        """
+        spec = importlib.util.spec_from_file_location(self.module_name(name), self.main_path(name))
+        module = importlib.util.module_from_spec(spec)
+        if fresh:
+            with open(spec.origin, "rb") as f:
+                code = compile(f.read(), spec.origin, "exec")
+            exec(code, module.__dict__)
+        else:
+            spec.loader.exec_module(module)
+        return module
+
+    def load(self, name):
+        """Import a mode, returns the module (exceptions propagate)."""
+        return self.replace(name, self.build(name))
+
+    def replace(self, name, module):
+        """Register module as the mode's code, it has to be set up again."""
+        self.modules[name] = module
+        sys.modules[self.module_name(name)] = module
+        self.warm.pop(name, None)
+        return module
+
+    def get(self, name):
+        module = self.modules.get(name)
+        if module is not None:
+            return module
+        with self.lock:
+            module = self.modules.get(name)
+            if module is None:
+                module = self.load(name)
+            return module
+
+    def is_warm(self, name, size):
+        """True if setup() already ran for this mode at this screen size."""
+        return name in self.warm and self.warm[name][0] == size
+
+    def setup(self, name, hwscreen, eyesy, module=None, keep=()):
+        """Run a mode's setup() and keep it warm, exceptions propagate.
+
+        With module given, that copy is set up and only replaces the
+        registered one if setup() succeeds.  Modes in keep, as well as
+        this one, are never evicted to make room.
+        """
+        before = self.process.memory_info().rss
+        if module is None:
+            self.warm.pop(name, None)
+            module = self.get(name)
+            module.setup(hwscreen, eyesy)
+        else:
+            module.setup(hwscreen, eyesy)
+            self.replace(name, module)
+        resident = max(self.process.memory_info().rss - before, 0)
+        self.warm[name] = ((eyesy.xres, eyesy.yres), resident)
+        self.trim(keep={name, *keep})
+        return module
+
+    def touch(self, name):
+        self.warm.move_to_end(name)
+
+    def resident(self):
+        return sum(r for _, r in self.warm.values())
+
+    def fits(self):
+        return len(self.warm) <= MAX_WARM and self.resident() <= self.budget
+
+    def trim(self, keep=()):
+        """Evict least recently used modes, other than those in keep, until within the count and memory budget."""
+        for name in list(self.warm):
+            if self.fits():
+                break
+            if name not in keep:
+                self.evict(name)
+
+    def evict(self, name):
+        self.warm.pop(name, None)
+        if self.modules.pop(name, None) is not None:
+            sys.modules.pop(self.module_name(name), None)
+            print(f"Evicted mode: {name}")
@@ -0,0 +1,158 @@
+import os
+import time
+import queue
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+import traceback
+
+# inotify(7) event bits
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_ISDIR = 0x40000000
+EVENT = struct.Struct("iIII")
+
+SETTLE = .25  # quiet time after the last write before a mode is reloaded
+POLL = 1.     # mtime scan interval when inotify isn't available
+
+class Inotify:
+    """Minimal inotify through libc, Linux only."""
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+        self.dirs = {}
+
+    def watch(self, path, mask):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd >= 0:
+            self.dirs[wd] = path
+
+    def read(self, timeout):
+        """Return (dir, name, mask) for events within timeout seconds."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self.fd, 8192)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+            if wd in self.dirs:
+                events.append((self.dirs[wd], name, mask))
+        return events
+
+class ModeReloader:
+    """Watches MODES_PATH and hot-reloads edited modes.
+
+    A changed main.py is re-imported on the watcher thread.  The new module
+    is handed to the main loop, which swaps it in at a frame boundary with
+    apply().  If the new code fails to import or its setup() throws, the
+    previous module keeps running and the error shows in the OSD.
+    """
+
+    def __init__(self, registry, workers=None):
+        self.registry = registry
+        # with modes running in worker processes, reloads are passed on and
+        # the workers import the new code, nothing is imported here
+        self.workers = workers or []
+        self.ready = queue.Queue()
+        self.changed = {}  # name -> time of last write
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def request(self, name):
+        """Reload a mode now, whether or not its file changed."""
+        self.changed[name] = 0
+
+    def _run(self):
+        try:
+            notify = Inotify()
+        except Exception as e:
+            print(f"inotify not available ({e}), polling modes for changes")
+            notify = None
+        if notify:
+            notify.watch(self.registry.modes_path, IN_CREATE | IN_MOVED_TO)
+            for name in self.registry.names:
+                notify.watch(os.path.join(self.registry.modes_path, name), IN_CLOSE_WRITE | IN_MOVED_TO)
+        mtimes = self._mtimes()
+
+        while self.running:
+            if notify:
+                for path, name, mask in notify.read(SETTLE):
+                    if path == self.registry.modes_path:
+                        # a new mode folder, watch it too
+                        if mask & IN_ISDIR:
+                            notify.watch(os.path.join(path, name), IN_CLOSE_WRITE | IN_MOVED_TO)
+                    elif name == "main.py":
+                        self.changed[os.path.basename(path)] = time.time()
+            else:
+                time.sleep(POLL)
+                current = self._mtimes()
+                for name, mtime in current.items():
+                    if mtimes.get(name) != mtime:
+                        self.changed[name] = time.time()
+                mtimes = current
+
+            now = time.time()
+            for name, when in list(self.changed.items()):
+                if now - when >= SETTLE:
+                    del self.changed[name]
+                    self._rebuild(name)
+
+    def _mtimes(self):
+        mtimes = {}
+        for name in self.registry.names:
+            try:
+                mtimes[name] = os.stat(self.registry.main_path(name)).st_mtime
+            except OSError:
+                pass
+        return mtimes
+
+    def _rebuild(self, name):
+        if self.workers:
+            self.ready.put((name, None, None))
+            return
+        try:
+            module = self.registry.build(name, fresh=True)
+            self.ready.put((name, module, None))
+            print(f"Reloaded mode code: {name}")
+        except Exception:
+            self.ready.put((name, None, traceback.format_exc()))
+
+    def apply(self, eyesy, hwscreen):
+        """Swap in reloaded modes, call once per frame from the main loop."""
+        while not self.ready.empty():
+            name, module, error = self.ready.get_nowait()
+            if self.workers:
+                for worker in self.workers:
+                    worker.reload(name)
+            elif error:
+                print(f"Reload of {name} failed, keeping the running version:\n{error}")
+                eyesy.error = error
+            elif name == eyesy.mode:
+                try:
+                    self.registry.setup(name, hwscreen, eyesy, module)
+                    eyesy.error = ''
+                except Exception:
+                    eyesy.error = traceback.format_exc()
+                    print(f"Setup of reloaded {name} failed, keeping the running version:\n{eyesy.error}")
+            elif name in self.registry.modules:
+                # not on screen, it gets set up when it is next selected
+                self.registry.replace(name, module)
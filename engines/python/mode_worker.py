@@ -0,0 +1,215 @@
+import os
+import time
+import atexit
+import traceback
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import pygame
+
+# eyesy attributes a mode reads, copied into the worker every frame
+STATE = [
+    "knob1", "knob2", "knob3", "knob4", "knob5", "knob",
+    "audio_in", "audio_in_r", "audio_peak", "audio_peak_r", "audio_fft", "audio_bands",
+    "audio_onset", "audio_bpm", "beat_phase", "audio_pitch", "audio_note", "audio_pitch_confidence",
+    "trig", "midi_notes", "midi_notes_last", "midi_note_new",
+    "midi_velocity", "midi_note_on_time", "midi_note_off_time", "midi_notes_changed", "new_midi", "midi_clk",
+    "midi_bpm", "midi_beat_phase", "midi_bar_phase", "midi_clock_running",
+    "auto_clear", "fg_palette", "bg_palette", "frame_count", "fps",
+]
+WATCHDOG_FRAMES = 15  # frame periods a draw may take before the worker is restarted
+SETUP_TIMEOUT = 10    # seconds a mode's setup() may take
+
+def _worker(conn, shm_name, size, paths, config, palettes):
+    """Worker process: runs one mode at a time into two shared-memory frames."""
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    import eyesy
+    import mode_registry
+
+    pygame.init()
+    pygame.display.set_mode((1, 1))  # convert() needs a display format
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frame_bytes = size[0] * size[1] * 4
+    # BGRA in memory is the XRGB8888 layout of the display surface
+    slots = [pygame.image.frombuffer(shm.buf[i * frame_bytes:(i + 1) * frame_bytes], size, "BGRA") for i in (0, 1)]
+
+    e = eyesy.Eyesy()
+    e.GRABS_PATH, e.MODES_PATH, e.SCENES_PATH, e.SYSTEM_PATH = paths
+    e.config = config
+    e.palettes = palettes
+    e.xres, e.yres = size
+    e.screen = slots[0]
+    e.font = pygame.font.Font("font.ttf", 16)
+    registry = mode_registry.ModeRegistry(e.MODES_PATH)
+    module = None
+
+    while True:
+        msg = conn.recv()
+        if msg[0] == "mode":
+            _, e.mode, e.mode_root = msg
+            try:
+                module = registry.setup(e.mode, slots[0], e)
+                conn.send(("mode", None))
+            except Exception:
+                module = None
+                conn.send(("mode", traceback.format_exc()))
+        elif msg[0] == "reload":
+            # the running module stays if the new code fails
+            name = msg[1]
+            try:
+                fresh = registry.build(name, fresh=True)
+                if name == e.mode:
+                    module = registry.setup(name, slots[0], e, fresh)
+                elif name in registry.modules:
+                    registry.replace(name, fresh)
+                conn.send(("reload", None))
+            except Exception:
+                conn.send(("reload", traceback.format_exc()))
+        elif msg[0] == "frame":
+            _, slot, state = msg
+            for key, value in state.items():
+                setattr(e, key, value)
+            surface = slots[slot]
+            if e.auto_clear:
+                surface.fill(e.bg_color)
+            else:
+                # the other slot holds the previous frame, carry it over for trails
+                surface.blit(slots[1 - slot], (0, 0))
+            error = None
+            if module:
+                try:
+                    module.draw(surface, e)
+                except Exception:
+                    error = traceback.format_exc()
+            conn.send(("done", slot, e.bg_color, error))
+        elif msg[0] == "stop":
+            break
+
+    slots = e.screen = None
+    try:
+        shm.close()
+    except BufferError:
+        pass  # a mode kept hold of its screen, the mapping goes with the process
+
+class ModeWorker:
+    """Runs the current mode's draw() in a separate process.
+
+    The worker renders into two frames in shared memory.  While the main
+    loop presents the last finished frame, the worker is already drawing the
+    next one into the other, so a draw() that runs long only holds the
+    picture; OSD, menu and controls keep running.  A worker that crashes or
+    takes longer than WATCHDOG_FRAMES frame periods is killed and restarted.
+    """
+
+    def __init__(self, eyesy):
+        self.ctx = multiprocessing.get_context("spawn")
+        self.paths = (eyesy.GRABS_PATH, eyesy.MODES_PATH, eyesy.SCENES_PATH, eyesy.SYSTEM_PATH)
+        self.config = eyesy.config
+        self.palettes = eyesy.palettes
+        self.process = None
+        self.shm = None
+        self.size = None
+        self.mode = None
+        self.restarts = 0
+        atexit.register(self.stop)
+
+    def start(self, size):
+        self.stop()
+        self.size = size
+        w, h = size
+        self.shm = shared_memory.SharedMemory(create=True, size=2 * w * h * 4)
+        # (w, h) views, the same layout surfarray.pixels2d gives
+        self.frames = [np.ndarray((h, w), np.uint32, self.shm.buf, i * w * h * 4).T for i in (0, 1)]
+        self.conn, child = self.ctx.Pipe()
+        self.process = self.ctx.Process(target=_worker, daemon=True,
+                                        args=(child, self.shm.name, size, self.paths, self.config, self.palettes))
+        self.process.start()
+        self.busy = None   # slot being drawn
+        self.ready = None  # last finished slot
+        self.sent_at = 0
+        self.setup_until = 0
+        if self.mode:
+            self.send_mode()
+
+    def send_mode(self):
+        self.conn.send(("mode",) + self.mode)
+        self.setup_until = time.perf_counter() + SETUP_TIMEOUT
+
+    def restart(self, why):
+        print(f"Mode worker {why}, restarting")
+        self.restarts += 1
+        # no point asking a stuck worker to stop
+        self.process.kill()
+        self.process.join()
+        self.start(self.size)
+
+    def set_mode(self, name, root, size):
+        self.mode = (name, root)
+        if size != self.size or not (self.process and self.process.is_alive()):
+            self.start(size)
+        else:
+            self.send_mode()
+
+    def reload(self, name):
+        """Have the worker import name's code again, and set it up if it's on screen."""
+        if self.process and self.process.is_alive():
+            self.conn.send(("reload", name))
+            self.setup_until = time.perf_counter() + SETUP_TIMEOUT
+
+    def frame(self, eyesy, period):
+        """Collect a finished frame and queue the next, returns the slot to present or None."""
+        if not self.process.is_alive():
+            self.restart("exited")
+            return None
+        try:
+            while self.conn.poll():
+                msg = self.conn.recv()
+                if msg[0] == "done":
+                    _, self.ready, eyesy.bg_color, error = msg
+                    self.busy = None
+                    if error: eyesy.error = error
+                elif msg[0] == "reload":
+                    self.setup_until = 0
+                    eyesy.error = msg[1] or ''
+                    if msg[1]: print(f"Reload in mode worker failed, keeping the running version:\n{msg[1]}")
+                else:
+                    self.setup_until = 0
+                    if msg[1]: eyesy.error = msg[1]
+        except (EOFError, OSError):
+            self.restart("pipe closed")
+            return None
+
+        if self.busy is not None:
+            now = time.perf_counter()
+            if now - self.sent_at > period * WATCHDOG_FRAMES and now > self.setup_until:
+                self.restart("timed out")
+                return None
+        else:
+            slot = 0 if self.ready is None else 1 - self.ready
+            self.conn.send(("frame", slot, {key: getattr(eyesy, key) for key in STATE}))
+            self.busy = slot
+            self.sent_at = time.perf_counter()
+        return self.ready
+
+    def present(self, slot, surface):
+        """Copy a finished frame into surface, which must be its size and 32 bit."""
+        pixels = pygame.surfarray.pixels2d(surface)
+        np.copyto(pixels, self.frames[slot])
+        del pixels
+
+    def stop(self):
+        if self.process:
+            try:
+                self.conn.send(("stop",))
+            except Exception:
+                pass
+            self.process.join(timeout=.5)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+            self.process = None
+        if self.shm:
+            self.frames = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
@@ -3,27 +3,10 @@ import socket
 import imp
 import subprocess
 import re
+import numpy as np
 
-def draw_knob_slider_480(screen, eyesy, offx, offy, index) :
-    # color based on knob seq state 
-    if eyesy.knob_seq_state == "playing":
-        color = eyesy.GREEN
-    elif eyesy.knob_seq_state == "recording" :
-        color = eyesy.RED
-    else :
-        color = eyesy.LGRAY
-  
-    # use knob1,2 etc, same as mode
-    if index == 0: knob = eyesy.knob1
-    elif index == 1: knob = eyesy.knob2
-    elif index == 2: knob = eyesy.knob3
-    elif index == 3: knob = eyesy.knob4
-    elif index == 4: knob = eyesy.knob5
-    pygame.draw.line(screen, color, [offx, offy], [offx + 10, offy], 1)
-    pygame.draw.line(screen, color, [offx, offy], [offx, offy + 24], 1)
-    pygame.draw.line(screen, color, [offx + 10, offy], [offx + 10, offy + 24], 1)
-    pygame.draw.line(screen, color, [offx, offy + 24], [offx + 10, offy + 24], 1)
-    pygame.draw.rect(screen, color, (offx, offy + 24 - int(24*knob), 10, int(24*knob)))
+GRAPH_HEIGHT = 60
+graph_surface = None
 
 def draw_vu_480(screen, eyesy, offx, offy):
     # L
@@ -63,17 +46,21 @@ def draw_midi(screen, eyesy, offx, offy):
         pygame.draw.line(screen, eyesy.LGRAY, [(i*6)+offx, offy], [(i*6)+offx, 24+offy], 1)
     for i in range(0, 5):
         pygame.draw.line(screen, eyesy.LGRAY, [offx, (i*6)+offy], [offx + 192, (i*6)+offy], 1)
-    for i in range(0,128):
-        if (eyesy.midi_notes[i] > 0):
-            pygame.draw.rect(screen, eyesy.LGRAY, (offx + 6 * (i % 32), offy + 6 * int(i / 32), 6, 6))
+    for i in np.flatnonzero(eyesy.midi_notes):
+        pygame.draw.rect(screen, eyesy.LGRAY, (offx + 6 * (i % 32), offy + 6 * (i // 32), 6, 6))
  
-def draw_gain_bar(screen, eyesy, offx, offy):
-    color = eyesy.LGRAY
-    pygame.draw.line(screen, color, [offx, offy], [offx + 118, offy], 1)
-    pygame.draw.line(screen, color, [offx, offy+5], [offx + 118, offy+5], 1)
-    pygame.draw.line(screen, color, [offx, offy], [offx, offy+5], 1)
-    pygame.draw.line(screen, color, [offx+118, offy], [offx+118, offy+5], 1)
-    pygame.draw.rect(screen, color, (offx, offy, int(eyesy.config["audio_gain"] * 118), 5))
+def draw_frame_graph(screen, eyesy, offx, offy):
+    global graph_surface
+    timer = eyesy.frame_timer
+    if graph_surface is None:
+        graph_surface = pygame.Surface((timer.size, GRAPH_HEIGHT))
+    # frame budget line sits halfway up
+    pixels = timer.graph_pixels(GRAPH_HEIGHT, 1. / eyesy.target_fps)
+    pygame.surfarray.blit_array(graph_surface, pixels)
+    screen.blit(graph_surface, (offx, offy))
+    message = f"{timer.last_frame_ms():.1f} ms  max {timer.worst_frame_ms():.1f}"
+    text = eyesy.font.render(message, True, eyesy.LGRAY, eyesy.BLACK)
+    screen.blit(text, (offx, offy + GRAPH_HEIGHT + 2))
 
 
 # loading banner helper
@@ -95,12 +82,10 @@ def loading_banner(screen, stuff) :
     screen.blit(text, text_rect)
     pygame.display.flip()
 
-def draw_color_palette(surface, eyesy):
+def draw_color_palette(surface, eyesy, xoff=450, yoff=10):
     
     # bg
     width, height = 170, 130 
-    xoff = 450
-    yoff = 10
     for i in range(height):
         # Get the color using the color_picker function
         color = eyesy.color_picker_bg_preview(i / height)
@@ -109,99 +94,180 @@ def draw_color_palette(surface, eyesy):
 
     # fg
     width, height = 125, 85  
-    xoff = 475
-    yoff = 35
+    xoff += 25
+    yoff += 25
     for i in range(height):
         # Get the color using the color_picker function
         color = eyesy.color_picker(i / height)
         # Draw a horizontal line (1 pixel high)
         pygame.draw.line(surface, color, (xoff, i + yoff), (width - 1 + xoff, i + yoff))
 
-def render_overlay_480(screen, eyesy) :
+PANEL_X, PANEL_Y = 10, 10
+PANEL_W, PANEL_H = 610, 130
 
-    font = eyesy.font
-    
-    pygame.draw.rect(screen, (0,0,0), (10, 10, 598, 130))
-    #pygame.draw.line(screen, eyesy.LGRAY, [0,480], [720,480], 1)
-    #pygame.draw.line(screen, eyesy.LGRAY, [720,480], [720,0], 1)
-    
-    draw_color_palette(screen, eyesy)
+class OverlayRenderer:
+    """OSD panel kept in its own surface and redrawn a widget at a time.
 
-    # first time through, gather some info
-    if eyesy.osd_first :
-        eyesy.osd_first = False
+    The static chrome (background, outlines, grid) is drawn once per display
+    size.  Every other widget is redrawn only when the value it shows
+    changes, and its screen rect is reported as dirty so a frame that didn't
+    redraw the mode can push just those rects with display.update().
+    """
 
-    # mode
-    txt_str = "Mode: (" + str(eyesy.mode_index + 1) +" of "+str(len(eyesy.mode_names)) + ") " + str(eyesy.mode)      
-    text = font.render(txt_str, True, eyesy.LGRAY, eyesy.BLACK)
-    text_rect = text.get_rect()
-    text_rect.x = 20
-    text_rect.centery = 30
-    screen.blit(text, text_rect)
- 
-    # usb
-    if eyesy.running_from_usb:
-        txt_str = "USB"    
-    else :
-        txt_str = "SD"
-    text = font.render(txt_str, True, eyesy.GREEN, eyesy.BLACK)
-    text_rect = text.get_rect()
-    text_rect.x = 404
-    text_rect.centery = 30
-    screen.blit(text, text_rect)
-         
-    # scene
-    if eyesy.scene_index >= 0 :
-        scene_str = "Scene: (" + str(eyesy.scene_index + 1) +" of "+str(len(eyesy.scenes)) + ") " + str(eyesy.scenes[eyesy.scene_index]["name"])
-    else:
-        scene_str = "Scene: None "
-    text = font.render(scene_str, True, eyesy.LGRAY, eyesy.BLACK)
-    text_rect = text.get_rect()
-    text_rect.x = 20
-    text_rect.centery = 55
-    screen.blit(text, text_rect)   
+    def __init__(self, eyesy, size):
+        self.eyesy = eyesy
+        self.size = size
+        self.panel = pygame.Surface((PANEL_W, PANEL_H))
+        self.values = {}
+        self.errors = {}
+        self.text_rects = {}
+        self.error_lines = []
+        self.dirty = []
+        self.draw_chrome()
 
-    # res
-    message = f"Screen Size: {eyesy.xres} x {eyesy.yres}"
-    text =          font.render(message, True, eyesy.LGRAY, eyesy.BLACK)
-    text_rect = text.get_rect()
-    text_rect.x = 20
-    text_rect.centery = 80
-    screen.blit(text, text_rect)   
- 
-    # version
-    message = f"v{eyesy.VERSION}"
-    text =          font.render(message, True, eyesy.LGRAY, eyesy.BLACK)
-    text_rect = text.get_rect()
-    text_rect.x = 380
-    text_rect.centery = 80
-    screen.blit(text, text_rect)   
-    
-    # knobs
-    draw_knob_slider_480(screen, eyesy, 20, 105, 0)
-    draw_knob_slider_480(screen, eyesy, 33, 105, 1)
-    draw_knob_slider_480(screen, eyesy, 46, 105, 2)
-    draw_knob_slider_480(screen, eyesy, 59, 105, 3)
-    draw_knob_slider_480(screen, eyesy, 73, 105, 4)
-
-    draw_midi(screen,eyesy,89,105)
-    draw_gain_bar(screen, eyesy, 286, 105)
-    draw_vu_480(screen, eyesy, 286, 113)
-       
-    # trigger
-    pygame.draw.rect(screen, eyesy.LGRAY, (410, 105, 25, 25), 1)
-    if eyesy.trig:
-        pygame.draw.rect(screen, (255,255,0), (410, 105, 25, 25))
-
-    # errors
-    i = 0
-    for errorline in eyesy.error.splitlines() :
-        errormsg = font.render(errorline, True, eyesy.LGRAY, eyesy.RED) 
-        text_rect.x = 50
-        text_rect.y = 150 + (i * 20)
-        screen.blit(errormsg, text_rect)
-        i += 1
+    def draw_chrome(self):
+        p = self.panel
+        p.fill((0, 0, 0))
+        # the palette preview overhangs the black box on the right
+        pygame.draw.rect(p, self.eyesy.LGRAY, (276, 95, 119, 6), 1)
+        for row in (103, 112):
+            for i in range(15):
+                pygame.draw.rect(p, self.eyesy.LGRAY, (276 + 8 * i, row, 7, 8), 1)
+        pygame.draw.rect(p, self.eyesy.LGRAY, (400, 95, 25, 25), 1)
+
+    def widget(self, key, value, rect, draw):
+        """Redraw rect (panel coordinates) with draw(panel, rect) if value changed."""
+        if key in self.values and self.values[key] == value:
+            return
+        rect = pygame.Rect(rect)
+        self.dirty.append(rect.move(PANEL_X, PANEL_Y))
+        try:
+            draw(self.panel, rect)
+        except Exception as e:
+            # not recorded, so it's tried again next frame; the rest of the panel still draws
+            self.failed(key, e)
+            return
+        self.values[key] = value
+        self.errors.pop(key, None)
+
+    def failed(self, key, error):
+        message = f"{type(error).__name__}: {error}"
+        if self.errors.get(key) != message:
+            self.errors[key] = message
+            print(f"OSD {key} error: {message}")
+
+    def text(self, key, string, color, x, centery):
+        if self.values.get(key) == string:
+            return
+        try:
+            text = self.eyesy.font.render(string, True, color, self.eyesy.BLACK)
+        except Exception as e:
+            self.failed(key, e)
+            return
+        self.values[key] = string
+        self.errors.pop(key, None)
+        old = self.text_rects.get(key)
+        if old:
+            self.panel.fill((0, 0, 0), old)
+            self.dirty.append(old.move(PANEL_X, PANEL_Y))
+        rect = text.get_rect()
+        rect.x = x - PANEL_X
+        rect.centery = centery - PANEL_Y
+        self.panel.blit(text, rect)
+        self.text_rects[key] = rect
+        self.dirty.append(rect.move(PANEL_X, PANEL_Y))
+
+    def draw_knob(self, index, color, level):
+        # the outline follows the knob sequencer state too
+        def draw(p, r):
+            p.fill((0, 0, 0), r)
+            pygame.draw.rect(p, color, r, 1)
+            p.fill(color, (r.x + 1, r.bottom - 1 - level, r.w - 2, level))
+        self.widget(f"knob{index}", (color, level), ((10, 23, 36, 49, 63)[index], 95, 11, 25), draw)
+
+    def draw_vu(self, key, row, level):
+        def draw(p, r):
+            for i in range(15):
+                color = (0, 0, 0)
+                if i < level:
+                    color = self.eyesy.GREEN
+                    if i > 8: color = (255, 255, 0)
+                    if i == 14: color = self.eyesy.RED
+                p.fill(color, (r.x + 8 * i, r.y, 5, 6))
+        self.widget(key, level, (277, row + 1, 117, 6), draw)
+
+    def draw_midi(self, changes):
+        def draw(p, r):
+            p.fill((0, 0, 0), r)
+            draw_midi(p, self.eyesy, r.x, r.y)
+        self.widget("midi", changes, (79, 95, 193, 25), draw)
 
+    def draw_gain(self, level):
+        def draw(p, r):
+            p.fill((0, 0, 0), r)
+            p.fill(self.eyesy.LGRAY, (r.x, r.y, level, r.h))
+        self.widget("gain", level, (277, 96, 117, 4), draw)
+
+    def render(self, screen):
+        eyesy = self.eyesy
+        self.dirty = []
+
+        palette_key = (eyesy.fg_palette, eyesy.bg_palette, id(eyesy.palettes))
+        self.widget("palette", palette_key, (440, 0, 170, 130),
+                    lambda p, r: draw_color_palette(p, eyesy, r.x, r.y))
+
+        mode_str = "Mode: (" + str(eyesy.mode_index + 1) +" of "+str(len(eyesy.mode_names)) + ") " + str(eyesy.mode)
+        self.text("mode", mode_str, eyesy.LGRAY, 20, 30)
+        self.text("usb", "USB" if eyesy.running_from_usb else "SD", eyesy.GREEN, 404, 30)
+        if eyesy.scene_index >= 0 :
+            scene_str = "Scene: (" + str(eyesy.scene_index + 1) +" of "+str(len(eyesy.scenes)) + ") " + str(eyesy.scenes[eyesy.scene_index]["name"])
+        else:
+            scene_str = "Scene: None "
+        self.text("scene", scene_str, eyesy.LGRAY, 20, 55)
+        self.text("res", f"Screen Size: {eyesy.xres} x {eyesy.yres}", eyesy.LGRAY, 20, 80)
+        self.text("version", f"v{eyesy.VERSION}", eyesy.LGRAY, 380, 80)
+
+        # color based on knob seq state
+        if eyesy.knob_seq_state == "playing":
+            color = eyesy.GREEN
+        elif eyesy.knob_seq_state == "recording" :
+            color = eyesy.RED
+        else :
+            color = eyesy.LGRAY
+        knobs = (eyesy.knob1, eyesy.knob2, eyesy.knob3, eyesy.knob4, eyesy.knob5)
+        for i in range(5):
+            self.draw_knob(i, color, int(23 * knobs[i]))
+
+        self.draw_midi(eyesy.midi_note_changes)
+        self.draw_gain(int(eyesy.config["audio_gain"] * 117))
+        self.draw_vu("vu", 103, int(eyesy.audio_peak / 2048))
+        self.draw_vu("vu_r", 112, int(eyesy.audio_peak_r / 2048))
+        self.widget("trig", eyesy.trig, (401, 96, 23, 23),
+                    lambda p, r: p.fill((255, 255, 0) if eyesy.trig else (0, 0, 0), r))
+
+        screen.blit(self.panel, (PANEL_X, PANEL_Y))
+
+        # changes every frame
+        draw_frame_graph(screen, eyesy, 450, 145)
+        self.dirty.append(pygame.Rect(450, 145, eyesy.frame_timer.size, GRAPH_HEIGHT + 20))
+
+        # errors, drawn over the mode so they go out every frame
+        if self.values.get("error") != eyesy.error:
+            self.values["error"] = eyesy.error
+            self.error_lines = [eyesy.font.render(line, True, eyesy.LGRAY, eyesy.RED)
+                                for line in eyesy.error.splitlines()]
+        for i, errormsg in enumerate(self.error_lines):
+            self.dirty.append(screen.blit(errormsg, (50, 150 + (i * 20))))
+        return self.dirty
+
+overlay = None
+
+def render_overlay_480(screen, eyesy) :
+    """Draw the OSD, returns the screen rects that changed since the last call."""
+    global overlay
+    if overlay is None or overlay.size != screen.get_size():
+        overlay = OverlayRenderer(eyesy, screen.get_size())
+    return overlay.render(screen)
 
     '''            
     # input level 
@@ -0,0 +1,148 @@
+import os
+import time
+import atexit
+import queue
+import threading
+import numpy as np
+import pygame
+import grabs
+
+QUEUE_FRAMES = 8  # frames buffered for the writer before new ones are dropped
+
+class Recorder:
+    """Records the output to GRABS_PATH on a writer thread.
+
+    The render loop only copies the frame and queues it; conversion and
+    disk writes happen on the writer thread.  If the writer falls behind
+    and the queue is full, the frame is dropped and counted, the render
+    loop never waits.  Y4M is written as 4:4:4 so no chroma resampling is
+    needed; PNG writes a numbered image sequence.  Stopping doesn't wait
+    either, the writer finishes what's queued on its own.
+    """
+
+    def __init__(self, grabs_path):
+        self.grabs_path = grabs_path
+        self.queue = None
+        self.thread = None
+        self.done = None
+        self.writers = []
+        self.recording = False
+        self.last = None
+        self.frames = 0
+        self.dropped = 0
+        self.path = None
+        atexit.register(self.close)
+
+    def start(self, size, fps, fmt="Y4M"):
+        if self.recording:
+            return
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        if fmt == "PNG":
+            self.path = os.path.join(self.grabs_path, f"rec_{timestamp}")
+            os.makedirs(self.path, exist_ok=True)
+            writer = self._write_png
+        else:
+            self.path = os.path.join(self.grabs_path, f"rec_{timestamp}.y4m")
+            writer = self._write_y4m
+        self.frames = self.dropped = 0
+        self.last = None
+        self.queue = queue.Queue(QUEUE_FRAMES)
+        self.done = threading.Event()
+        self.recording = True
+        self.thread = threading.Thread(target=writer, args=(self.queue, self.done, self.path, size, fps), daemon=True)
+        self.thread.start()
+        # a previous recording's writer may still be finishing
+        self.writers = [t for t in self.writers if t.is_alive()] + [self.thread]
+        print(f"Recording to {self.path}")
+
+    def stop(self):
+        if not self.recording:
+            return
+        self.recording = False
+        self.done.set()
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass  # the writer sees done once it has emptied the queue
+        self.last = None
+        print(f"Stopped recording {self.path}: {self.frames} frames queued, dropped {self.dropped}")
+
+    def close(self):
+        """Stop and wait for every writer to finish, for shutdown."""
+        self.stop()
+        for thread in self.writers:
+            thread.join()
+
+    def toggle(self, size, fps, fmt="Y4M"):
+        if self.recording:
+            self.stop()
+        else:
+            self.start(size, fps, fmt)
+
+    def capture(self, surface):
+        """Queue a copy of surface, call once per frame."""
+        if self.recording:
+            self.last = surface.copy()
+            self._put(self.last)
+
+    def repeat(self):
+        """Queue the previous frame again, for frames that were held."""
+        if self.recording and self.last is not None:
+            self._put(self.last)
+
+    def _put(self, frame):
+        try:
+            self.queue.put_nowait(frame)
+            self.frames += 1
+        except queue.Full:
+            self.dropped += 1
+
+    @staticmethod
+    def _frames(q, done):
+        while True:
+            try:
+                frame = q.get(timeout=.1)
+            except queue.Empty:
+                if done.is_set():
+                    return
+                continue
+            if frame is None:
+                return
+            yield frame
+
+    def _write_y4m(self, q, done, path, size, fps):
+        w, h = size
+        # 59.94 is written as 60000:1001
+        rate = f"{int(fps)}:1" if fps == int(fps) else f"{round(fps * 1001)}:1001"
+        try:
+            with open(path, "wb") as f:
+                f.write(f"YUV4MPEG2 W{w} H{h} F{rate} Ip A1:1 C444\n".encode())
+                written = 0
+                for frame in self._frames(q, done):
+                    rgb = pygame.surfarray.array3d(frame).transpose(1, 0, 2).astype(np.int32)
+                    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+                    # BT.601 studio range, fixed point
+                    y = ((66 * r + 129 * g + 25 * b + 128) >> 8) + 16
+                    u = ((-38 * r - 74 * g + 112 * b + 128) >> 8) + 128
+                    v = ((112 * r - 94 * g - 18 * b + 128) >> 8) + 128
+                    f.write(b"FRAME\n")
+                    f.write(np.stack((y, u, v)).astype(np.uint8).tobytes())
+                    written += 1
+            print(f"Recorded {written} frames to {path}")
+        except Exception as e:
+            self.failed(e)
+
+    def _write_png(self, q, done, path, size, fps):
+        try:
+            written = 0
+            for frame in self._frames(q, done):
+                grabs.write_png(frame, os.path.join(path, f"frame_{written:05d}.png"))
+                written += 1
+            print(f"Recorded {written} frames to {path}")
+        except Exception as e:
+            self.failed(e)
+
+    def failed(self, error):
+        # capture stops queueing, what's left in this queue is dropped with it
+        print(f"Recording failed: {error}")
+        self.recording = False
@@ -0,0 +1,100 @@
+import pygame
+
+# internal render sizes, as a fraction of the display size
+SCALES = [1., 2. / 3., 1. / 2.]
+
+DOWN_FRAMES = 15     # frames over budget in a row before dropping a level
+UP_FRAMES = 150      # frames with headroom in a row before going back up
+HEADROOM = .6        # fraction of the budget a frame must stay under to count as headroom
+
+class RenderScaler:
+    """Renders modes at a reduced internal resolution and upscales on present.
+
+    The level follows frame cost: sustained overruns drop to a smaller
+    internal size and sustained headroom climbs back.  A new level only takes
+    effect when a mode is set up, so eyesy.xres/yres never change under a
+    running mode.  The last level used for each mode is remembered, so a
+    heavy mode comes back at the size it could hold.
+
+    When nothing has to be composited on top (no OSD or menu) and the mode
+    runs at full size, it draws straight into the display surface and the
+    present copy is skipped.
+    """
+
+    def __init__(self, display_size, full_surface=None):
+        self.display_size = display_size
+        self.surfaces = {0: full_surface or pygame.Surface(display_size)}
+        self.enabled = False
+        self.level = 0
+        self.pending = 0
+        self.direct = False
+        self.mode = None
+        self.mode_levels = {}
+        self.over_count = 0
+        self.under_count = 0
+
+    @property
+    def surface(self):
+        return self.surfaces[self.level]
+
+    def size_for(self, level):
+        s = SCALES[level]
+        return (int(self.display_size[0] * s), int(self.display_size[1] * s))
+
+    def update(self, cost, period):
+        """Feed in the last frame's cost, picks the level for the next setup."""
+        if not self.enabled:
+            return
+        if cost > period:
+            self.over_count += 1
+            self.under_count = 0
+        elif cost < period * HEADROOM:
+            self.under_count += 1
+            self.over_count = 0
+        else:
+            self.over_count = self.under_count = 0
+
+        if self.over_count >= DOWN_FRAMES and self.pending < len(SCALES) - 1:
+            self.pending += 1
+            self.over_count = 0
+        elif self.under_count >= UP_FRAMES and self.pending > 0:
+            self.pending -= 1
+            self.under_count = 0
+
+    def level_for(self, name):
+        return self.mode_levels.get(name, 0) if self.enabled else 0
+
+    def begin_mode(self, eyesy):
+        """Switch to the level for the mode about to be set up and point eyesy at its surface."""
+        if self.mode is not None:
+            self.mode_levels[self.mode] = self.pending
+        self.mode = eyesy.mode
+        self.level = self.pending = self.level_for(eyesy.mode)
+        self.over_count = self.under_count = 0
+        if self.level not in self.surfaces:
+            self.surfaces[self.level] = pygame.Surface(self.size_for(self.level))
+        eyesy.xres, eyesy.yres = self.surfaces[self.level].get_size()
+
+    def select_target(self, eyesy, hwscreen, direct):
+        """Pick the surface the mode draws into this frame.
+
+        Switching between the display surface and the intermediate one copies
+        the frame across once, so modes that don't clear (trails) carry on.
+        """
+        direct = direct and self.level == 0
+        if direct != self.direct:
+            if direct:
+                hwscreen.blit(self.surface, (0, 0))
+            else:
+                self.surface.blit(hwscreen, (0, 0))
+            self.direct = direct
+        eyesy.screen = hwscreen if direct else self.surface
+        return eyesy.screen
+
+    def present(self, hwscreen):
+        if self.direct:
+            return
+        if self.level == 0:
+            hwscreen.blit(self.surface, (0, 0))
+        else:
+            pygame.transform.scale(self.surface, self.display_size, hwscreen)
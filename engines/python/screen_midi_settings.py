@@ -1,4 +1,5 @@
 import pygame
+import midi
 from screen import Screen
 from widget_menu import WidgetMenu, MenuItem
 
@@ -23,10 +24,14 @@ class ScreenMIDISettings(Screen):
         self.menu.items.append(self.create_adjustable_menu_item("knob3_cc", -1, 127,  "Knob 3 CC: {value}"))
         self.menu.items.append(self.create_adjustable_menu_item("knob4_cc", -1, 127,  "Knob 4 CC: {value}"))
         self.menu.items.append(self.create_adjustable_menu_item("knob5_cc", -1, 127,  "Knob 5 CC: {value}"))
+        self.menu.items.append(self.create_adjustable_menu_item("knob_14bit", 0, 1, ""))
         self.menu.items.append(self.create_adjustable_menu_item("auto_clear_cc", -1, 127,  "Screen Clear On/Off CC: {value}"))
         self.menu.items.append(self.create_adjustable_menu_item("fg_palette_cc", -1, 127,  "FG Palette CC: {value}"))
         self.menu.items.append(self.create_adjustable_menu_item("bg_palette_cc", -1, 127,  "BG Palette CC: {value}"))
         self.menu.items.append(self.create_adjustable_menu_item("mode_cc", -1, 127,  "Mode Select CC: {value}"))
+        self.menu.items.append(self.create_adjustable_menu_item("mixer_xfade_cc", -1, 127,  "Mixer Crossfade CC: {value}"))
+        self.menu.items.append(self.create_adjustable_menu_item("mixer_blend_cc", -1, 127,  "Mixer Blend CC: {value}"))
+        self.menu.items.append(self.create_adjustable_menu_item("layer_b_cc", -1, 127,  "Layer B Mode CC: {value}"))
         self.menu.items.append(self.create_adjustable_menu_item("notes_change_mode", 0, 1, ""))
 
         self.menu.items.append(MenuItem('◀  Exit', self.exit_menu))
@@ -56,6 +61,9 @@ class ScreenMIDISettings(Screen):
     def text_for_menu_item(self, item) :
         if item.name == "trigger_source" :
            item.text = "Trigger Source: " + self.eyesy.TRIGGER_SOURCES[item.value] 
+        elif item.name == "knob_14bit" :
+            if item.value == 1: item.text = "Knob CCs 14-bit (+32 LSB): Yes"
+            else : item.text = "Knob CCs 14-bit (+32 LSB): No"
         elif item.name == "notes_change_mode" :
             if item.value == 1: item.text = "MIDI Notes Select Mode: Yes"
             else : item.text = "MIDI Notes Select Mode: No"
@@ -82,6 +90,14 @@ class ScreenMIDISettings(Screen):
         text_rect.x = 50
         text_rect.centery = 300
         surface.blit(text, text_rect)   
+        # incoming rates and how far the render loop is behind
+        rates = ", ".join(f"{label} {rate:.0f}/s" for label, rate in self.eyesy.midi_rates.items())
+        message = f"MIDI in: {rates or 'None'}  queue {self.eyesy.midi_queue_depth} (max {self.eyesy.midi_max_queue_depth})"
+        text = self.font.render(message, True, self.eyesy.LGRAY, self.eyesy.BLACK)
+        text_rect = text.get_rect()
+        text_rect.x = 50
+        text_rect.centery = 325
+        surface.blit(text, text_rect)
      
 
 
@@ -122,6 +138,7 @@ class ScreenMIDISettings(Screen):
             if i >= 0:
                 item = self.menu.items[i]
                 self.eyesy.config[key] = item.value
+        midi.build_cc_table(self.eyesy)
         self.eyesy.save_config_file()
         self.exit_menu()
     
@@ -1,14 +1,228 @@
-from multiprocessing import Process, Array, Value, Lock
-from ctypes import c_float
 import alsaaudio
 import struct
 import pygame
 import time
 import numpy as np
+from audio_ring import AudioRing, FFT_SIZE, FFT_BINS, BANDS
 
-BUFFER_SIZE = 100  # Size of the circular buffer
+RATE = 44100
+HOP = FFT_SIZE // 4          # frames between spectra, about 6 ms
+BAND_RANGE = (40., 16000.)   # Hz covered by the bands
+PEAK_HALF_LIFE = .1          # seconds for the peak level to fall by half
 
-def audio_processing(shared_buffer, shared_buffer_r, write_index, gain, peak, peak_r, lock):
+ONSET_WINDOW = .5            # seconds of flux the adaptive threshold looks at
+ONSET_SENSITIVITY = 1.5      # threshold is median + this many mean deviations
+ONSET_FLOOR = .02            # flux below this is never an onset (silence, hiss)
+ONSET_REFRACTORY = .08       # seconds after an onset before the next
+TEMPO_WINDOW = 6.            # seconds of flux the tempo is estimated from
+TEMPO_EVERY = 1.             # seconds between tempo estimates
+BPM_RANGE = (60., 180.)
+
+PITCH_RANGE = (90., 1500.)   # Hz, the low end is bounded by half of FFT_SIZE
+PITCH_THRESHOLD = .15        # YIN dip that counts as periodic
+PITCH_SILENCE = 200.         # RMS below which there is no pitch
+
+def chunk_rms(frames, smooth_window):
+    """RMS of each smooth_window rows of (n, 2) stereo frames, as a (chunks, 2) array.
+
+    A trailing partial chunk is left out.
+    """
+    chunks = len(frames) // smooth_window
+    chunked = frames[:chunks * smooth_window].reshape(chunks, smooth_window, 2)
+    return np.sqrt(np.mean(chunked * chunked, axis=1))
+
+class Spectrum:
+    """Windowed FFT of the last FFT_SIZE frames, taken every HOP frames.
+
+    The magnitude spectrum is the mean of both channels, scaled so a full
+    scale sine at unity gain peaks at 1.  Bands are mean magnitudes over
+    log spaced ranges between BAND_RANGE, each at least one bin wide.
+    """
+
+    def __init__(self, rate=RATE):
+        self.history = np.zeros((FFT_SIZE, 2), np.float32)
+        self.pending = 0
+        self.window = np.hanning(FFT_SIZE).astype(np.float32)[:, None]
+        self.scale = 2. / (self.window.sum() * 32768.)
+        self.fft = np.zeros(FFT_BINS, np.float32)
+        self.bands = np.zeros(BANDS, np.float32)
+        edges = np.geomspace(*BAND_RANGE, BANDS + 1) * FFT_SIZE / rate
+        edges = np.maximum(edges.astype(int), 1)
+        for i in range(1, len(edges)):
+            edges[i] = max(edges[i], edges[i - 1] + 1)
+        self.edges = np.minimum(edges, FFT_BINS)
+        self.widths = np.maximum(np.diff(self.edges), 1)
+
+    def feed(self, frames):
+        """Add (n, 2) frames, returns True when a new spectrum is ready."""
+        n = min(len(frames), FFT_SIZE)
+        self.history[:-n] = self.history[n:]
+        self.history[-n:] = frames[-n:]
+        self.pending += len(frames)
+        if self.pending < HOP:
+            return False
+        self.pending = 0
+        spectrum = np.abs(np.fft.rfft(self.history * self.window, axis=0))
+        np.multiply(spectrum[:FFT_BINS].mean(axis=1), self.scale, out=self.fft)
+        # band sums from a running total, one pass whatever the band count
+        total = np.concatenate(([0.], np.cumsum(self.fft)))
+        self.bands[:] = (total[self.edges[1:]] - total[self.edges[:-1]]) / self.widths
+        return True
+
+class OnsetTracker:
+    """Spectral flux onsets and an autocorrelation tempo estimate.
+
+    Flux is the summed rise in log magnitude from one spectrum to the next.
+    An onset is a flux peak above an adaptive threshold over the last
+    ONSET_WINDOW seconds.  The tempo is the strongest autocorrelation lag
+    of the flux over TEMPO_WINDOW seconds, weighted towards 120 BPM to
+    keep it off double and half time, and beat_time is the last onset that
+    fell on the predicted beat grid.
+
+    feed() only does the flux and the peak test.  The threshold and the
+    tempo are the costly parts and are called separately, so the audio loop
+    can give each an ALSA period without a spectrum in it.
+    """
+
+    def __init__(self, rate=RATE):
+        self.hop_time = HOP / rate
+        self.previous = np.zeros(FFT_BINS, np.float32)
+        self.flux = np.zeros(int(TEMPO_WINDOW / self.hop_time), np.float32)
+        self.recent = int(ONSET_WINDOW / self.hop_time)
+        self.count = 0
+        self.last_onset = 0.
+        self.bpm = 0.
+        self.beat_time = 0.
+        self.since_tempo = 0.
+        self.threshold = ONSET_FLOOR
+        self.threshold_due = False
+        lags = 60. / np.array(BPM_RANGE[::-1]) / self.hop_time
+        self.lag_min, self.lag_max = int(lags[0]), int(np.ceil(lags[1]))
+        bpms = 60. / (np.arange(self.lag_min, self.lag_max + 1) * self.hop_time)
+        self.weight = np.exp(-.5 * (np.log2(bpms / 120.) / 1.) ** 2)
+
+    def feed(self, magnitude, now):
+        """Add a spectrum taken at now, returns True if it is an onset."""
+        log_mag = np.log1p(magnitude * 100.)
+        flux = float(np.maximum(log_mag - self.previous, 0).sum()) / FFT_BINS
+        self.previous = log_mag
+        self.flux[:-1] = self.flux[1:]
+        self.flux[-1] = flux
+        self.since_tempo += self.hop_time
+        self.threshold_due = True
+
+        # the peak is confirmed one hop late, when the flux starts falling,
+        # against the threshold from the flux up to and including it
+        candidate = self.flux[-2]
+        if candidate < self.threshold or candidate < self.flux[-3] or candidate <= flux:
+            return False
+        when = now - self.hop_time
+        if when - self.last_onset < ONSET_REFRACTORY:
+            return False
+        self.last_onset = when
+        self.count += 1
+        self.align_beat(when)
+        return True
+
+    @property
+    def tempo_due(self):
+        return self.since_tempo >= TEMPO_EVERY
+
+    def update_threshold(self):
+        """Adaptive threshold over the last ONSET_WINDOW of flux, for the next feed()."""
+        recent = self.flux[-self.recent:]
+        median = np.median(recent)
+        self.threshold = max(median + ONSET_SENSITIVITY * np.mean(np.abs(recent - median)), ONSET_FLOOR)
+        self.threshold_due = False
+
+    def estimate_tempo(self):
+        self.since_tempo = 0.
+        x = self.flux - self.flux.mean()
+        n = len(x)
+        power = np.abs(np.fft.rfft(x, 2 * n)) ** 2
+        ac = np.fft.irfft(power)[self.lag_min:self.lag_max + 1]
+        if ac.max() <= 0:
+            return
+        scores = ac * self.weight
+        i = int(scores.argmax())
+        # parabolic interpolation between lags for a finer tempo
+        if 0 < i < len(scores) - 1:
+            a, b, c = scores[i - 1:i + 2]
+            denom = a - 2 * b + c
+            offset = .5 * (a - c) / denom if denom else 0.
+        else:
+            offset = 0.
+        self.bpm = 60. / ((self.lag_min + i + offset) * self.hop_time)
+
+    def align_beat(self, when):
+        if not self.bpm or not self.beat_time:
+            self.beat_time = when
+            return
+        period = 60. / self.bpm
+        beats = round((when - self.beat_time) / period)
+        if abs(when - (self.beat_time + beats * period)) < .2 * period:
+            self.beat_time = when
+
+class PitchTracker:
+    """YIN pitch detection on both channels, run on the spectrum's history.
+
+    The difference function comes from an FFT cross-correlation of both
+    channels at once.  The lag is the first dip of the cumulative mean
+    normalised difference below PITCH_THRESHOLD, refined by parabolic
+    interpolation; confidence is one minus the depth of that dip.  Without
+    such a dip there is no pitch: 0 Hz and note -1.
+    """
+
+    def __init__(self, rate=RATE):
+        self.rate = rate
+        self.size = FFT_SIZE // 2  # integration window, also the longest lag
+        self.tau_min = int(rate / PITCH_RANGE[1])
+        self.tau_max = min(int(rate / PITCH_RANGE[0]), self.size - 1)
+        self.taus = np.arange(1, self.size + 1, dtype=np.float32)[:, None]
+        self.pitch = np.zeros(2, np.float32)
+        self.note = np.full(2, -1, np.int32)
+        self.confidence = np.zeros(2, np.float32)
+
+    def feed(self, history):
+        """Update pitch, note and confidence from (FFT_SIZE, 2) frames."""
+        w = self.size
+        x = history - history.mean(axis=0)
+        # r(tau) = sum x[j] x[j + tau] for j < w
+        # anything from FFT_SIZE + w avoids circular wrap, a power of two is quickest
+        n = 2 * FFT_SIZE
+        r = np.fft.irfft(np.conj(np.fft.rfft(x[:w], n, axis=0)) * np.fft.rfft(x, n, axis=0), n, axis=0)[:w + 1]
+        energy = np.concatenate((np.zeros((1, 2), np.float32), np.cumsum(x * x, axis=0)))
+        # energy of x[tau:tau + w] for each lag
+        shifted = energy[w:2 * w + 1] - energy[:w + 1]
+        d = shifted[0] + shifted - 2 * r
+        cmnd = d[1:] * self.taus / np.maximum(np.cumsum(d[1:], axis=0), 1e-9)
+
+        silent = np.sqrt(shifted[0] / w) < PITCH_SILENCE
+        for ch in range(2):
+            self.pitch[ch], self.note[ch], self.confidence[ch] = 0., -1, 0.
+            if silent[ch]:
+                continue
+            curve = cmnd[:, ch]  # curve[i] is lag i + 1
+            window = curve[self.tau_min - 1:self.tau_max]
+            below = np.flatnonzero(window < PITCH_THRESHOLD)
+            if not len(below):
+                continue  # not periodic enough to call
+            i = below[0]
+            # walk down to the bottom of the dip
+            while i + 1 < len(window) and window[i + 1] < window[i]:
+                i += 1
+            tau = i + self.tau_min
+            confidence = 1. - float(window[i])
+            if 0 < i < len(window) - 1:
+                a, b, c = window[i - 1:i + 2]
+                denom = a - 2 * b + c
+                if denom:
+                    tau += .5 * (a - c) / denom
+            self.pitch[ch] = self.rate / tau
+            self.note[ch] = int(round(69 + 12 * np.log2(self.pitch[ch] / 440.)))
+            self.confidence[ch] = max(confidence, 0.)
+
+def audio_processing(ring_name):
     def find_input_device():
         """Find the first available input device"""
         cards = alsaaudio.cards()
@@ -26,7 +240,7 @@ def audio_processing(shared_buffer, shared_buffer_r, write_index, gain, peak, pe
         
         # PCM configuration
         channels = 2  # Stereo input
-        rate = 44100
+        rate = RATE
         format = alsaaudio.PCM_FORMAT_S16_LE
         period_size = 32
         
@@ -41,9 +255,12 @@ def audio_processing(shared_buffer, shared_buffer_r, write_index, gain, peak, pe
         
         # Smoothing variables
         smooth_window = 8
-        samples_l = np.zeros(smooth_window)
-        samples_r = np.zeros(smooth_window)
-        ptr = 0
+        ring = AudioRing(ring_name)
+        spectrum = Spectrum(rate)
+        onsets = OnsetTracker(rate)
+        pitch = PitchTracker(rate)
+        hops = 0
+        pitch_due = False
         
         while True:
             length, data = inp.read()
@@ -51,34 +268,49 @@ def audio_processing(shared_buffer, shared_buffer_r, write_index, gain, peak, pe
             if length > 0:
                 # Convert bytes to numpy array of int16 samples
                 samples = np.frombuffer(data, dtype='<i2')
+                # one float copy with gain applied, everything below reads it
+                frames = samples.reshape(-1, 2).astype(np.float32)
+                frames *= float(ring.gain[0])
+                rms = chunk_rms(frames, smooth_window)
+                if len(rms) == 0:
+                    continue
+                new_spectrum = spectrum.feed(frames)
+                onset = new_spectrum and onsets.feed(spectrum.fft, time.monotonic())
+                # the heavier steps get periods of their own within the hop:
+                # the spectrum at 0, tempo at 1/4, pitch (every other hop)
+                # at 1/2 and the onset threshold at 3/4
+                if new_spectrum:
+                    hops += 1
+                    pitch_due = hops % 2 == 0
+                new_tempo = onsets.tempo_due and HOP // 4 <= spectrum.pending < HOP // 2
+                if new_tempo:
+                    onsets.estimate_tempo()
+                new_pitch = pitch_due and spectrum.pending >= HOP // 2
+                if new_pitch:
+                    pitch.feed(spectrum.history)
+                    pitch_due = False
+                if onsets.threshold_due and spectrum.pending >= 3 * HOP // 4:
+                    onsets.update_threshold()
+                decay = .5 ** (len(frames) / (rate * PEAK_HALF_LIFE))
                 
-                # Deinterleave stereo channels
-                samples_l_new = samples[0::2]
-                samples_r_new = samples[1::2]
-                
-                # Process samples in chunks
-                for i in range(0, len(samples_l_new), smooth_window):
-                    chunk_l = samples_l_new[i:i+smooth_window]
-                    chunk_r = samples_r_new[i:i+smooth_window]
-                    
-                    if len(chunk_l) == smooth_window:
-                        # Apply gain and convert to float
-                        chunk_l = chunk_l * gain.value
-                        chunk_r = chunk_r * gain.value
-                        
-                        # Calculate RMS (root mean square) for the chunk
-                        rms_l = np.sqrt(np.mean(chunk_l**2))
-                        rms_r = np.sqrt(np.mean(chunk_r**2))
-                        
-                        # Update circular buffer
-                        with lock:
-                            shared_buffer[write_index.value] = rms_l
-                            shared_buffer_r[write_index.value] = rms_r
-                            write_index.value = (write_index.value + 1) % BUFFER_SIZE
-                            
-                            # Update peak values
-                            peak.value = max(peak.value, rms_l)
-                            peak_r.value = max(peak_r.value, rms_r)
+                # Update circular buffer, peaks and spectrum in one go, the renderer never waits on this
+                ring.begin_write()
+                ring.push(rms)
+                np.maximum(ring.peak * decay, rms.max(axis=0), out=ring.peak)
+                if new_spectrum:
+                    ring.fft[:] = spectrum.fft
+                    ring.bands[:] = spectrum.bands
+                if new_tempo:
+                    ring.bpm[0] = onsets.bpm
+                if new_pitch:
+                    ring.pitch[:] = pitch.pitch
+                    ring.note[:] = pitch.note
+                    ring.pitch_confidence[:] = pitch.confidence
+                if onset:
+                    ring.onset_time[0] = onsets.last_onset
+                    ring.beat_time[0] = onsets.beat_time
+                    ring.onset_count[0] = onsets.count
+                ring.end_write()
                             
     except Exception as e:
         print(f"Audio processing error: {str(e)}")
@@ -0,0 +1,67 @@
+import pygame
+
+PREROLL = 2  # frames the incoming mode draws unseen before the transition starts
+
+class ModeTransition:
+    """Blends from the outgoing mode's last frame into the incoming mode.
+
+    On a mode switch the frame on screen is kept, the incoming mode draws
+    PREROLL frames behind it, then the two are blended over the transition
+    time.  The per-frame progress is worked out once when the switch
+    starts, and every style is a plain blit, so each transition frame
+    costs about the same as a normal one.
+    """
+
+    def __init__(self, display_size):
+        self.size = display_size
+        self.outgoing = pygame.Surface(display_size)
+        self.incoming = pygame.Surface(display_size)
+        self.style = "Cut"
+        self.schedule = []
+        self.step = 0
+        self.mode = None
+
+    @property
+    def active(self):
+        return self.step < len(self.schedule)
+
+    def begin(self, hwscreen, mode, style, duration, fps):
+        """Keep the frame on screen and plan the blend into mode."""
+        previous, self.mode = self.mode, mode
+        self.step = 0
+        if previous is None or previous == mode or style == "Cut" or duration <= 0:
+            self.schedule = []
+            return
+        self.outgoing.blit(hwscreen, (0, 0))
+        self.style = style
+        frames = max(int(duration * fps), 1)
+        # smoothstep eased progress, held at 0 through the preroll
+        self.schedule = [0.] * PREROLL + [self.ease((i + 1) / frames) for i in range(frames)]
+
+    @staticmethod
+    def ease(t):
+        return t * t * (3 - 2 * t)
+
+    def apply(self, hwscreen):
+        """Composite the outgoing frame over the incoming one already in hwscreen."""
+        if not self.active:
+            return
+        t = self.schedule[self.step]
+        self.step += 1
+        w, h = self.size
+        if t <= 0:
+            hwscreen.blit(self.outgoing, (0, 0))
+        elif self.style == "Dissolve":
+            self.outgoing.set_alpha(int(255 * (1 - t)))
+            hwscreen.blit(self.outgoing, (0, 0))
+            self.outgoing.set_alpha(None)
+        elif self.style == "Wipe":
+            # the incoming mode is revealed left to right
+            x = int(w * t)
+            hwscreen.blit(self.outgoing, (x, 0), (x, 0, w - x, h))
+        elif self.style == "Zoom":
+            # the incoming mode grows out of the centre
+            self.incoming.blit(hwscreen, (0, 0))
+            hwscreen.blit(self.outgoing, (0, 0))
+            sw, sh = max(int(w * t), 1), max(int(h * t), 1)
+            hwscreen.blit(pygame.transform.scale(self.incoming, (sw, sh)), ((w - sw) // 2, (h - sh) // 2))